@@ -1,4 +1,4 @@
-from flask import Flask
+from flask import Flask, Response
 from flask_cors import CORS
 from dotenv import load_dotenv
 import os
@@ -19,15 +19,27 @@ from routes.admin_routes import admin_bp
 
 # Import database
 from database.db import init_db
+from database.change_streams import init_change_streams
+from models.stock_hold import init_stock_holds
+from models.stock_shard import init_stock_shards
+from models.product import register_rating_commands
+from models.review import init_review_votes
+from middleware.metrics import init_metrics
+from middleware.n_plus_one import init_n_plus_one_detector
 
-def create_app():
+from config import Config, config
+
+def create_app(config_name=None):
     app = Flask(__name__)
     
-    # Configuration
+    # Configuration ('development', 'production' or 'testing' via argument or
+    # APP_CONFIG; the base Config otherwise)
+    config_name = config_name or os.getenv('APP_CONFIG')
+    app.config.from_object(config[config_name] if config_name else Config)
     app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'dev-secret-key')
     app.config['JWT_SECRET_KEY'] = os.getenv('JWT_SECRET_KEY', 'jwt-secret-key')
-    app.config['MONGODB_URI'] = os.getenv('MONGODB_URI')
-    app.config['MONGODB_DB_NAME'] = os.getenv('MONGODB_DB_NAME', 'foxnuts_farm')
+    app.config['MONGODB_URI'] = os.getenv('MONGODB_URI', Config.MONGODB_URI)
+    app.config['MONGODB_DB_NAME'] = os.getenv('MONGODB_DB_NAME', app.config['MONGODB_DB_NAME'])
     
     # CORS
     CORS(app, resources={
@@ -39,9 +51,28 @@ def create_app():
         }
     })
     
+    # MongoDB command instrumentation (must be registered before the client exists)
+    mongo_metrics = init_metrics(app)
+    init_n_plus_one_detector(app)
+    
     # Initialize database
     init_db(app)
     
+    # Cross-worker cache invalidation (watcher thread starts inside each worker)
+    init_change_streams(app)
+    
+    # Cart inventory holds (expired holds are swept by a thread in each worker)
+    init_stock_holds(app)
+    
+    # Sharded stock counters for hot products (totals consolidated per worker)
+    init_stock_shards(app)
+    
+    # `flask ratings rebuild`
+    register_rating_commands(app)
+    
+    # Write-behind buffer for review "helpful" votes
+    init_review_votes(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(product_bp, url_prefix='/api/products')
@@ -58,6 +89,11 @@ def create_app():
     def health_check():
         return {'status': 'healthy', 'message': 'Foxnuts Farm API is running'}, 200
     
+    # Prometheus metrics endpoint
+    @app.route('/metrics')
+    def metrics():
+        return Response(mongo_metrics.render(), mimetype='text/plain; version=0.0.4')
+    
     # Root endpoint
     @app.route('/')
     def root():
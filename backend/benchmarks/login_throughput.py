@@ -0,0 +1,89 @@
+"""
+Login throughput through /api/auth/login at different password hash costs.
+
+Runs against a real MongoDB (MONGODB_URI) in a throwaway database, e.g.
+
+    python benchmarks/login_throughput.py --threads 16 --logins 20 \
+        --methods scrypt:16384:8:1 scrypt:32768:8:1 pbkdf2:sha256:600000
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['MONGODB_DB_NAME'] = os.getenv('BENCH_DB_NAME', 'foxnuts_farm_bench')
+os.environ['CHANGE_STREAMS_ENABLED'] = 'False'
+
+from app import create_app
+from database.db import get_db
+from models.password_hasher import hasher
+
+EMAIL = 'bench-login@example.com'
+PASSWORD = 'BenchPassw0rd!'
+
+def seed():
+    """(Re)create the benchmark user with the current hash method"""
+    db = get_db()
+    db.users.delete_many({'email': EMAIL})
+    db.users.insert_one({
+        'email': EMAIL,
+        'password': hasher.hash(PASSWORD),
+        'name': 'Bench User',
+        'role': 'customer',
+        'tokenVersion': 0
+    })
+
+def run(app, threads, logins):
+    """threads * logins concurrent logins; return (seconds, status code counts)"""
+    statuses = {}
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads + 1)
+    
+    def worker():
+        client = app.test_client()
+        start_barrier.wait()
+        for _ in range(logins):
+            status = client.post('/api/auth/login', json={'email': EMAIL, 'password': PASSWORD}).status_code
+            with lock:
+                statuses[status] = statuses.get(status, 0) + 1
+    
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return time.perf_counter() - started, statuses
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--logins', type=int, default=20, help='Logins per thread')
+    parser.add_argument('--workers', type=int, default=hasher.workers, help='Hashing processes (0 = inline)')
+    parser.add_argument('--methods', nargs='+', default=['scrypt:16384:8:1', 'scrypt:32768:8:1', 'pbkdf2:sha256:600000'])
+    args = parser.parse_args()
+    
+    app = create_app()
+    total = args.threads * args.logins
+    
+    print(f"\n{args.threads} threads x {args.logins} logins, {args.workers} hashing process(es)\n")
+    for method in args.methods:
+        hasher.configure(method=method, workers=args.workers)
+        with app.app_context():
+            seed()
+        elapsed, statuses = run(app, args.threads, args.logins)
+        ok = statuses.get(200, 0)
+        print(f"  {method:<24} {ok / elapsed:8.1f} logins/s  "
+              f"({elapsed:.2f}s, {ok}/{total} ok, {statuses.get(503, 0)} busy)")
+    
+    hasher.shutdown()
+    with app.app_context():
+        get_db().users.delete_many({'email': EMAIL})
+        get_db().refresh_tokens.delete_many({})
+
+if __name__ == '__main__':
+    main()
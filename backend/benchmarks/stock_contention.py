@@ -0,0 +1,102 @@
+"""
+Order throughput on one hot product: single stock document vs sharded counters.
+
+Runs against a real MongoDB (MONGODB_URI) in a throwaway database, e.g.
+
+    python benchmarks/stock_contention.py --threads 32 --orders 200 --shards 8
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ['MONGODB_DB_NAME'] = os.getenv('BENCH_DB_NAME', 'foxnuts_farm_bench')
+os.environ['CHANGE_STREAMS_ENABLED'] = 'False'
+
+from app import create_app
+from database.db import get_db
+from models.product import Product
+from models.stock_shard import StockShards
+from bson.objectid import ObjectId
+from datetime import datetime
+
+def seed(stock, shards):
+    """Create the hot product, optionally sharded, and return its id"""
+    db = get_db()
+    db.products.delete_many({'slug': 'bench-caramel-crunch'})
+    db.stock_shards.delete_many({})
+    product_id = str(db.products.insert_one({
+        'name': 'Bench Caramel Crunch',
+        'slug': 'bench-caramel-crunch',
+        'description': 'Benchmark product',
+        'price': 12.99,
+        'category': 'benchmark',
+        'stock': stock,
+        'isActive': True,
+        'createdAt': datetime.utcnow(),
+        'updatedAt': datetime.utcnow()
+    }).inserted_id)
+    if shards > 1:
+        StockShards.enable(product_id, shards)
+    return product_id
+
+def run(app, threads, orders, shards):
+    """Place threads * orders single-unit orders concurrently; return (seconds, failures, left)"""
+    stock = threads * orders
+    with app.app_context():
+        product_id = seed(stock, shards)
+    
+    failures = []
+    start_barrier = threading.Barrier(threads + 1)
+    
+    def worker():
+        failed = 0
+        with app.app_context():
+            start_barrier.wait()
+            for _ in range(orders):
+                if Product.reserve_stock([{'productId': product_id, 'quantity': 1}]):
+                    failed += 1
+        failures.append(failed)
+    
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    
+    with app.app_context():
+        if shards > 1:
+            left = StockShards.totals([product_id]).get(product_id, 0)
+        else:
+            left = get_db().products.find_one({'_id': ObjectId(product_id)})['stock']
+    return elapsed, sum(failures), left
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--orders', type=int, default=200, help='Orders per thread')
+    parser.add_argument('--shards', type=int, default=8)
+    args = parser.parse_args()
+    
+    app = create_app()
+    total = args.threads * args.orders
+    
+    print(f"\n{args.threads} threads x {args.orders} orders on one product\n")
+    for label, shards in (('single document', 1), (f'{args.shards} shards', args.shards)):
+        elapsed, failed, left = run(app, args.threads, args.orders, shards)
+        print(f"  {label:<16} {total / elapsed:8.0f} orders/s  "
+              f"({elapsed:.2f}s, {failed} rejected, {left} units left)")
+    
+    with app.app_context():
+        db = get_db()
+        db.products.delete_many({'slug': 'bench-caramel-crunch'})
+        db.stock_shards.delete_many({})
+
+if __name__ == '__main__':
+    main()
@@ -8,10 +8,82 @@ class Config:
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
     JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
     
+    # Password hashing (werkzeug method string). Changing the method rehashes
+    # each user's password on their next login.
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    # Hashing processes per worker (0 hashes inline on the request thread),
+    # extra hashes allowed to wait for one, and how long a request waits
+    # before giving up with 503
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_QUEUE = int(os.getenv('PASSWORD_HASH_MAX_QUEUE', 16))
+    PASSWORD_HASH_TIMEOUT = float(os.getenv('PASSWORD_HASH_TIMEOUT', 10))
+    
     # MongoDB
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017/')
     MONGODB_DB_NAME = os.getenv('MONGODB_DB_NAME', 'foxnuts_farm')
     
+    # MongoDB connection pool (one client per worker process)
+    MONGODB_MAX_POOL_SIZE = int(os.getenv('MONGODB_MAX_POOL_SIZE', 50))
+    MONGODB_MIN_POOL_SIZE = int(os.getenv('MONGODB_MIN_POOL_SIZE', 0))
+    MONGODB_MAX_IDLE_TIME_MS = int(os.getenv('MONGODB_MAX_IDLE_TIME_MS', 300000))
+    MONGODB_MAX_CONNECTING = int(os.getenv('MONGODB_MAX_CONNECTING', 2))
+    MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv('MONGODB_WAIT_QUEUE_TIMEOUT_MS', 5000))
+    MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv('MONGODB_CONNECT_TIMEOUT_MS', 5000))
+    MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv('MONGODB_SOCKET_TIMEOUT_MS', 30000))
+    MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv('MONGODB_SERVER_SELECTION_TIMEOUT_MS', 5000))
+    
+    # Build missing indexes at boot when the registry version changed
+    # (otherwise run `flask indexes sync` as a deploy step)
+    MONGODB_AUTO_SYNC_INDEXES = os.getenv('MONGODB_AUTO_SYNC_INDEXES', 'True') == 'True'
+    
+    # Count MongoDB reply bytes in /metrics (re-encodes every reply; for profiling only)
+    MONGO_METRICS_REPLY_BYTES = os.getenv('MONGO_METRICS_REPLY_BYTES', 'False') == 'True'
+    
+    # N+1 query detection (always on in debug/testing)
+    MONGO_N_PLUS_ONE_DETECTION = os.getenv('MONGO_N_PLUS_ONE_DETECTION', 'False') == 'True'
+    MONGO_N_PLUS_ONE_THRESHOLD = int(os.getenv('MONGO_N_PLUS_ONE_THRESHOLD', 3))
+    # Fail the request with NPlusOneError instead of only logging (on by default in testing)
+    MONGO_N_PLUS_ONE_RAISE = os.getenv('MONGO_N_PLUS_ONE_RAISE', 'False') == 'True'
+    
+    # In-process product catalog cache (per worker)
+    CATALOG_CACHE_TTL = int(os.getenv('CATALOG_CACHE_TTL', 60))
+    CATALOG_CACHE_MAX_SIZE = int(os.getenv('CATALOG_CACHE_MAX_SIZE', 1024))
+    SEARCH_CACHE_MAX_SIZE = int(os.getenv('SEARCH_CACHE_MAX_SIZE', 256))
+    
+    # userId -> display name for review listings (per worker)
+    USER_NAME_CACHE_MAX_SIZE = int(os.getenv('USER_NAME_CACHE_MAX_SIZE', 4096))
+    USER_NAME_CACHE_TTL = int(os.getenv('USER_NAME_CACHE_TTL', 300))
+    
+    # Authenticated principals (id, email, name, role) per worker; kept short
+    # so changes made outside the app still take effect quickly
+    PRINCIPAL_CACHE_MAX_SIZE = int(os.getenv('PRINCIPAL_CACHE_MAX_SIZE', 10000))
+    PRINCIPAL_CACHE_TTL = int(os.getenv('PRINCIPAL_CACHE_TTL', 30))
+    # Per-user token versions checked against the tokenVersion claim; bounds
+    # how long a revoked token can survive on another worker without change streams
+    TOKEN_VERSION_CACHE_TTL = int(os.getenv('TOKEN_VERSION_CACHE_TTL', 60))
+    
+    # Most helpful reviews kept in each product's review summary
+    REVIEW_SUMMARY_TOP_REVIEWS = int(os.getenv('REVIEW_SUMMARY_TOP_REVIEWS', 3))
+    
+    # Cross-worker cache invalidation via change streams (requires a replica set;
+    # without one, caches fall back to TTL expiry)
+    CHANGE_STREAMS_ENABLED = os.getenv('CHANGE_STREAMS_ENABLED', 'True') == 'True'
+    CHANGE_STREAM_TOKEN_PERSIST_SECONDS = int(os.getenv('CHANGE_STREAM_TOKEN_PERSIST_SECONDS', 5))
+    
+    # Cart inventory holds: adding to the cart holds stock for a limited time
+    CART_HOLDS_ENABLED = os.getenv('CART_HOLDS_ENABLED', 'False') == 'True'
+    CART_HOLD_TTL_SECONDS = int(os.getenv('CART_HOLD_TTL_SECONDS', 900))
+    CART_HOLD_SWEEP_INTERVAL = int(os.getenv('CART_HOLD_SWEEP_INTERVAL', 30))
+    CART_HOLD_SWEEP_BATCH_SIZE = int(os.getenv('CART_HOLD_SWEEP_BATCH_SIZE', 500))
+    
+    # Sharded stock counters: how often shard totals are written back to products.stock
+    STOCK_SHARD_CONSOLIDATE_INTERVAL = int(os.getenv('STOCK_SHARD_CONSOLIDATE_INTERVAL', 10))
+    
+    # "Helpful" votes are buffered per worker and written in batches
+    # (a buffer size of 0 writes every vote immediately)
+    HELPFUL_VOTE_FLUSH_INTERVAL = int(os.getenv('HELPFUL_VOTE_FLUSH_INTERVAL', 5))
+    HELPFUL_VOTE_BUFFER_SIZE = int(os.getenv('HELPFUL_VOTE_BUFFER_SIZE', 500))
+    
     # Email
     SENDGRID_API_KEY = os.getenv('SENDGRID_API_KEY')
     FROM_EMAIL = os.getenv('FROM_EMAIL', 'noreply@foxnutsfarm.com')
@@ -51,6 +123,7 @@ class TestingConfig(Config):
     DEBUG = True
     TESTING = True
     MONGODB_DB_NAME = 'foxnuts_farm_test'
+    MONGO_N_PLUS_ONE_RAISE = os.getenv('MONGO_N_PLUS_ONE_RAISE', 'True') == 'True'
 
 config = {
     'development': DevelopmentConfig,
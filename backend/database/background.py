@@ -0,0 +1,57 @@
+"""Per-worker periodic background jobs"""
+from pymongo.errors import PyMongoError
+import os
+import threading
+
+class PeriodicTask:
+    """
+    Daemon thread that runs `job()` inside an app context every `interval`
+    seconds. Started lazily from a before_request hook so that each worker
+    process (forked after create_app) runs its own copy.
+    """
+    
+    def __init__(self, app, name, interval, job):
+        self.app = app
+        self.name = name
+        self.interval = interval
+        self.job = job
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+    
+    def ensure_started(self):
+        """Start the thread once per process"""
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        """Ask the thread to exit"""
+        self._stop.set()
+    
+    def _run(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.interval):
+                try:
+                    self.job()
+                except PyMongoError as e:
+                    print(f"⚠️  {self.name} failed: {str(e)}")
+
+def start_periodic_task(app, name, interval, job):
+    """Register a PeriodicTask under app.extensions[name] and start it per worker"""
+    task = PeriodicTask(app, name, interval, job)
+    app.extensions[name] = task
+    
+    @app.before_request
+    def start_task():
+        task.ensure_started()
+    
+    return task
@@ -0,0 +1,75 @@
+"""In-process caches shared by the models"""
+from collections import OrderedDict
+import threading
+import time
+
+# Every cache created in this process, by name, for /metrics
+CACHES = {}
+
+class LRUCache:
+    """Thread-safe, size-bounded LRU cache with per-entry TTL"""
+    
+    MISSING = object()
+    
+    def __init__(self, name, max_size=1024, ttl=60):
+        self.name = name
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        CACHES[name] = self
+    
+    def get(self, key):
+        """Return the cached value for `key`, or LRUCache.MISSING"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[1] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return LRUCache.MISSING
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def set(self, key, value, ttl=None):
+        """Store `value`, evicting the least recently used entry when full"""
+        expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+    
+    def delete(self, *keys):
+        """Remove entries by key"""
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+    
+    def delete_where(self, predicate):
+        """Remove every entry for which predicate(key, value) is true"""
+        with self._lock:
+            stale = [k for k, (v, _) in self._data.items() if predicate(k, v)]
+            for key in stale:
+                del self._data[key]
+    
+    def clear(self):
+        """Remove all entries"""
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        """Counters for monitoring"""
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self._data)
+            }
@@ -0,0 +1,188 @@
+"""Cross-worker cache invalidation driven by MongoDB change streams"""
+from pymongo.errors import OperationFailure, PyMongoError
+from datetime import datetime
+import os
+import socket
+import threading
+import time
+
+# Collections whose writes invalidate in-process caches
+WATCHED_COLLECTIONS = ('products', 'users', 'orders', 'review_summaries')
+
+# Server error codes meaning change streams cannot be used on this deployment
+UNSUPPORTED_CODES = (40573, 40324, 136)
+HISTORY_LOST_CODES = (280, 286)
+
+TOKEN_COLLECTION = 'schema_meta'
+
+_handlers = {collection: [] for collection in WATCHED_COLLECTIONS}
+
+def subscribe(collection, handler, fields=None):
+    """
+    Register handler(doc_id) to run when a document in `collection` changes.
+    doc_id is None when the whole collection must be treated as stale.
+    With `fields`, updates that touch none of those top-level fields are skipped.
+    """
+    _handlers.setdefault(collection, []).append((handler, frozenset(fields) if fields else None))
+
+def publish(collection, doc_id=None, changed_fields=None):
+    """
+    Run the invalidation handlers for a collection. `changed_fields` is the
+    set of top-level fields an update touched, or None when unknown.
+    """
+    for handler, fields in _handlers.get(collection, []):
+        if fields is not None and changed_fields is not None and not fields & changed_fields:
+            continue
+        try:
+            handler(doc_id)
+        except Exception as e:
+            print(f"⚠️  Cache invalidation for {collection} failed: {str(e)}")
+
+def publish_all():
+    """Treat every watched collection as stale (events may have been missed)"""
+    for collection in list(_handlers):
+        publish(collection)
+
+class ChangeStreamWatcher:
+    """Background thread that turns change events into local cache invalidations"""
+    
+    def __init__(self, app):
+        self.app = app
+        self.token_id = f"change_stream:{socket.gethostname()}"
+        self.persist_interval = app.config.get('CHANGE_STREAM_TOKEN_PERSIST_SECONDS', 5)
+        self.active = False
+        self.unsupported = False
+        self._pid = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+    
+    def ensure_started(self):
+        """Start the watcher thread once per process (workers fork after create_app)"""
+        if self.unsupported:
+            return
+        if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+            return
+        
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(
+                target=self._run, name='change-stream-watcher', daemon=True
+            )
+            self._thread.start()
+    
+    def stop(self):
+        """Ask the watcher thread to exit"""
+        self._stop.set()
+    
+    def _load_token(self, db):
+        marker = db[TOKEN_COLLECTION].find_one({'_id': self.token_id})
+        return marker.get('resumeToken') if marker else None
+    
+    def _save_token(self, db, token):
+        db[TOKEN_COLLECTION].update_one(
+            {'_id': self.token_id},
+            {'$set': {'resumeToken': token, 'updatedAt': datetime.utcnow()}},
+            upsert=True
+        )
+    
+    def _dispatch(self, change):
+        collection = change.get('ns', {}).get('coll')
+        operation = change.get('operationType')
+        
+        if operation in ('drop', 'rename', 'dropDatabase', 'invalidate'):
+            if collection is None:
+                publish_all()
+            else:
+                publish(collection)
+            return
+        
+        changed_fields = None
+        if operation == 'update':
+            description = change.get('updateDescription', {})
+            changed_fields = {
+                path.split('.', 1)[0]
+                for path in list(description.get('updatedFields', {})) + description.get('removedFields', [])
+            }
+        
+        doc_id = change.get('documentKey', {}).get('_id')
+        publish(collection, str(doc_id) if doc_id is not None else None, changed_fields)
+    
+    def _run(self):
+        from database.db import get_db
+        
+        pipeline = [{'$match': {'ns.coll': {'$in': list(WATCHED_COLLECTIONS)}}}]
+        backoff = 1
+        
+        with self.app.app_context():
+            db = get_db()
+            
+            try:
+                token = self._load_token(db)
+            except PyMongoError:
+                token = None
+            
+            while not self._stop.is_set():
+                try:
+                    with db.watch(pipeline, resume_after=token, max_await_time_ms=1000) as stream:
+                        if not self.active:
+                            # Anything written while we were not listening may be cached
+                            publish_all()
+                        self.active = True
+                        backoff = 1
+                        saved_token = token
+                        last_saved = time.monotonic()
+                        
+                        while not self._stop.is_set() and stream.alive:
+                            change = stream.try_next()
+                            if change is not None:
+                                self._dispatch(change)
+                            
+                            token = stream.resume_token
+                            if token != saved_token and time.monotonic() - last_saved >= self.persist_interval:
+                                self._save_token(db, token)
+                                saved_token = token
+                                last_saved = time.monotonic()
+                        
+                        if token != saved_token:
+                            self._save_token(db, token)
+                
+                except OperationFailure as e:
+                    self.active = False
+                    if e.code in UNSUPPORTED_CODES:
+                        self.unsupported = True
+                        print("⚠️  Change streams unavailable (needs a replica set); "
+                              "caches fall back to TTL expiry")
+                        return
+                    if e.code in HISTORY_LOST_CODES:
+                        # Resume point fell off the oplog: start fresh
+                        token = None
+                        continue
+                    print(f"⚠️  Change stream error: {str(e)}")
+                
+                except (PyMongoError, NotImplementedError) as e:
+                    self.active = False
+                    if isinstance(e, NotImplementedError):
+                        self.unsupported = True
+                        return
+                    print(f"⚠️  Change stream error: {str(e)}")
+                
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, 30)
+
+def init_change_streams(app):
+    """Register the change stream watcher; it starts lazily in each worker"""
+    if not app.config.get('CHANGE_STREAMS_ENABLED', True):
+        return None
+    
+    watcher = ChangeStreamWatcher(app)
+    app.extensions['change_stream_watcher'] = watcher
+    
+    @app.before_request
+    def start_change_stream_watcher():
+        watcher.ensure_started()
+    
+    return watcher
@@ -0,0 +1,76 @@
+"""Write-behind buffering for hot counters"""
+from database.db import get_db
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from bson.objectid import ObjectId
+import threading
+
+class CounterBuffer:
+    """
+    Coalesces $inc updates of one counter field per document in memory and
+    writes them as a single unordered bulk_write. Increments not yet flushed
+    are lost only if the process dies without a clean shutdown. `on_flush`
+    is called with the written ids after every flush, inline or periodic.
+    """
+    
+    def __init__(self, collection, field, max_pending=500, on_flush=None):
+        self.collection = collection
+        self.field = field
+        self.max_pending = max_pending
+        self.on_flush = on_flush
+        self._pending = {}
+        self._lock = threading.Lock()
+    
+    def add(self, doc_id, amount=1):
+        """
+        Buffer an increment and return the amount now pending for the
+        document in this process. Flushes inline when max_pending distinct
+        documents are waiting.
+        """
+        doc_id = str(doc_id)
+        with self._lock:
+            pending = self._pending.get(doc_id, 0) + amount
+            self._pending[doc_id] = pending
+            full = len(self._pending) >= self.max_pending
+        
+        if full:
+            try:
+                self.flush()
+            except PyMongoError:
+                # Increments stay buffered for the periodic flush
+                pass
+        return pending
+    
+    def pending(self, doc_id):
+        """Increments buffered for a document and not yet written"""
+        with self._lock:
+            return self._pending.get(str(doc_id), 0)
+    
+    def flush(self):
+        """Write all buffered increments; returns the ids that were written"""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        
+        if not batch:
+            return []
+        
+        try:
+            get_db()[self.collection].bulk_write([
+                UpdateOne({'_id': ObjectId(doc_id)}, {'$inc': {self.field: amount}})
+                for doc_id, amount in batch.items()
+            ], ordered=False)
+        except PyMongoError:
+            # Put the increments back so the next flush retries them
+            with self._lock:
+                for doc_id, amount in batch.items():
+                    self._pending[doc_id] = self._pending.get(doc_id, 0) + amount
+            raise
+        
+        written = list(batch)
+        if self.on_flush:
+            try:
+                self.on_flush(written)
+            except Exception as e:
+                # The increments are written; don't retry them for a failed callback
+                print(f"⚠️  {self.collection}.{self.field} flush callback failed: {str(e)}")
+        return written
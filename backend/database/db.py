@@ -1,59 +1,107 @@
+"""Process-wide MongoClient, per-request database handles and index checks at startup"""
 from pymongo import MongoClient
 from flask import current_app, g
+from database.indexes import indexes_current, register_index_commands, sync_indexes
+from config import Config
 import os
+import threading
+
+# One MongoClient per worker process. MongoClient is thread-safe and keeps its
+# own connection pool, so requests only borrow a database handle from it.
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
+def _client_options(config):
+    """Build MongoClient pool/timeout options from app config (Config defaults)"""
+    def option(name):
+        return config.get(name, getattr(Config, name))
+    
+    return {
+        'maxPoolSize': option('MONGODB_MAX_POOL_SIZE'),
+        'minPoolSize': option('MONGODB_MIN_POOL_SIZE'),
+        'maxIdleTimeMS': option('MONGODB_MAX_IDLE_TIME_MS'),
+        'maxConnecting': option('MONGODB_MAX_CONNECTING'),
+        'waitQueueTimeoutMS': option('MONGODB_WAIT_QUEUE_TIMEOUT_MS'),
+        'connectTimeoutMS': option('MONGODB_CONNECT_TIMEOUT_MS'),
+        'socketTimeoutMS': option('MONGODB_SOCKET_TIMEOUT_MS'),
+        'serverSelectionTimeoutMS': option('MONGODB_SERVER_SELECTION_TIMEOUT_MS')
+    }
+
+def get_client():
+    """Get the process-wide MongoClient, creating it after fork if needed"""
+    global _client, _client_pid
+    
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            # A client inherited from the parent (e.g. gunicorn --preload) must
+            # not be reused in the child; build a fresh one for this process.
+            _client = MongoClient(
+                current_app.config['MONGODB_URI'],
+                **_client_options(current_app.config)
+            )
+            _client_pid = pid
+    
+    return _client
+
+def close_client():
+    """Close the process-wide MongoClient"""
+    global _client, _client_pid
+    
+    with _client_lock:
+        if _client is not None and _client_pid == os.getpid():
+            _client.close()
+        _client = None
+        _client_pid = None
+
+def _reset_client_after_fork():
+    """Drop the parent's client reference in a forked child"""
+    global _client, _client_pid, _client_lock
+    _client = None
+    _client_pid = None
+    _client_lock = threading.Lock()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_client_after_fork)
 
 def get_db():
     """Get database connection"""
     if 'db' not in g:
-        client = MongoClient(current_app.config['MONGODB_URI'])
-        g.db = client[current_app.config['MONGODB_DB_NAME']]
+        g.db = get_client()[current_app.config['MONGODB_DB_NAME']]
     return g.db
 
 def init_db(app):
     """Initialize database connection"""
     @app.teardown_appcontext
     def close_db(error):
-        db = g.pop('db', None)
-        if db is not None:
-            db.client.close()
+        # The pooled client outlives the request; only release the handle
+        g.pop('db', None)
+    
+    register_index_commands(app)
     
-    # Create indexes on first run
+    # Indexes are declared in database/indexes.py and built by `flask indexes sync`;
+    # worker boot only checks the recorded registry version.
     with app.app_context():
         try:
             db = get_db()
             
-            # Users collection indexes
-            db.users.create_index('email', unique=True)
-            db.users.create_index('createdAt')
-            
-            # Products collection indexes
-            db.products.create_index('slug', unique=True)
-            db.products.create_index('category')
-            db.products.create_index('tags')
-            db.products.create_index([('name', 'text'), ('description', 'text')])
-            
-            # Orders collection indexes
-            db.orders.create_index('userId')
-            db.orders.create_index('orderNumber', unique=True)
-            db.orders.create_index('createdAt')
-            db.orders.create_index('orderStatus')
-            
-            # Reviews collection indexes
-            db.reviews.create_index('productId')
-            db.reviews.create_index('userId')
-            db.reviews.create_index([('userId', 1), ('productId', 1)], unique=True)
-            
-            # Newsletter collection indexes
-            db.newsletter.create_index('email', unique=True)
-            
-            # Subscriptions collection indexes
-            db.subscriptions.create_index('userId')
-            db.subscriptions.create_index('status')
-            
-            print("✅ Database indexes created successfully")
-            
+            if indexes_current(db):
+                print("✅ Database indexes up to date")
+            elif app.config.get('MONGODB_AUTO_SYNC_INDEXES', True):
+                _, failed = sync_indexes(db)
+                if failed:
+                    print(f"⚠️  Database indexes partly synced - failed on {', '.join(failed)}")
+                else:
+                    print("✅ Database indexes synced")
+            else:
+                print("⚠️  Database indexes out of date - run `flask indexes sync`")
+        
         except Exception as e:
-            print(f"⚠️  Error creating indexes: {str(e)}")
+            print(f"⚠️  Error checking indexes: {str(e)}")
 
 def seed_products():
     """Seed initial products data"""
@@ -0,0 +1,238 @@
+"""Declarative index registry and lifecycle commands"""
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel
+from pymongo.errors import PyMongoError
+from datetime import datetime
+import click
+import hashlib
+import json
+
+# Seconds past expiresAt before MongoDB deletes a hold the sweeper missed
+HOLD_TTL_GRACE_SECONDS = 3600
+
+# Every index the application relies on, per collection. Add new indexes here
+# (never with ad-hoc create_index calls) and run `flask indexes sync`.
+INDEXES = {
+    'users': [
+        IndexModel([('email', ASCENDING)], unique=True),
+        IndexModel([('createdAt', DESCENDING), ('_id', DESCENDING)])
+    ],
+    'products': [
+        IndexModel([('slug', ASCENDING)], unique=True),
+        IndexModel([('category', ASCENDING)]),
+        IndexModel([('tags', ASCENDING)]),
+        IndexModel([('name', TEXT), ('description', TEXT)]),
+        # Catalog version (latest updatedAt) for ETags
+        IndexModel([('updatedAt', DESCENDING)]),
+        # Keyset pagination over active products for each supported sortBy
+        IndexModel([('isActive', ASCENDING), ('createdAt', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('isActive', ASCENDING), ('price', ASCENDING), ('_id', ASCENDING)]),
+        IndexModel([('isActive', ASCENDING), ('averageRating', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('isActive', ASCENDING), ('name', ASCENDING), ('_id', ASCENDING)]),
+        # Products with sharded stock, for consolidation
+        IndexModel([('stockShards', ASCENDING)], sparse=True)
+    ],
+    'orders': [
+        IndexModel([('orderNumber', ASCENDING)], unique=True),
+        # (filter, createdAt, _id) compound indexes back cursor pagination
+        IndexModel([('userId', ASCENDING), ('createdAt', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('createdAt', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('orderStatus', ASCENDING), ('createdAt', DESCENDING), ('_id', DESCENDING)])
+    ],
+    'reviews': [
+        IndexModel([('productId', ASCENDING), ('createdAt', DESCENDING), ('_id', DESCENDING)]),
+        # "Most helpful" listings and review summaries
+        IndexModel([('productId', ASCENDING), ('helpful', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('userId', ASCENDING), ('createdAt', DESCENDING), ('_id', DESCENDING)]),
+        IndexModel([('userId', ASCENDING), ('productId', ASCENDING)], unique=True)
+    ],
+    'newsletter': [
+        IndexModel([('email', ASCENDING)], unique=True),
+        IndexModel([('isActive', ASCENDING), ('subscribedAt', DESCENDING), ('_id', DESCENDING)])
+    ],
+    'subscriptions': [
+        IndexModel([('userId', ASCENDING)]),
+        IndexModel([('status', ASCENDING)])
+    ],
+    'carts': [
+        IndexModel([('userId', ASCENDING)], unique=True)
+    ],
+    'stock_holds': [
+        # The sweeper releases expired holds (and their heldStock); the TTL
+        # index only removes stragglers left behind if it stops running
+        IndexModel([('expiresAt', ASCENDING)], expireAfterSeconds=HOLD_TTL_GRACE_SECONDS),
+        IndexModel([('userId', ASCENDING), ('productId', ASCENDING)]),
+        IndexModel([('claimedBy', ASCENDING)], sparse=True)
+    ],
+    'refresh_tokens': [
+        IndexModel([('tokenHash', ASCENDING)], unique=True),
+        IndexModel([('family', ASCENDING)]),
+        IndexModel([('userId', ASCENDING)]),
+        # Expired (and redeemed) tokens disappear once they pass expiresAt
+        IndexModel([('expiresAt', ASCENDING)], expireAfterSeconds=0)
+    ],
+    'stock_shards': [
+        IndexModel([('productId', ASCENDING), ('shard', ASCENDING)], unique=True)
+    ]
+}
+
+META_COLLECTION = 'schema_meta'
+MARKER_ID = 'indexes'
+
+# Index options that must match for a live index to count as the registered one
+COMPARED_OPTIONS = ('unique', 'sparse', 'expireAfterSeconds', 'partialFilterExpression')
+
+def _spec(model):
+    """Comparable dict for an IndexModel"""
+    document = model.document
+    spec = {'key': list(document['key'].items())}
+    for option in COMPARED_OPTIONS:
+        if option in document:
+            spec[option] = document[option]
+    return spec
+
+def registry_version():
+    """Stable hash of the index registry"""
+    payload = {
+        collection: sorted((model.document['name'], _spec(model)) for model in models)
+        for collection, models in INDEXES.items()
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha1(encoded).hexdigest()[:16]
+
+def diff_indexes(db):
+    """Compare the registry with live index_information() per collection"""
+    report = {}
+    
+    for collection, models in INDEXES.items():
+        live = db[collection].index_information()
+        registered = {model.document['name']: model for model in models}
+        
+        missing = []
+        conflicting = []
+        for name, model in registered.items():
+            if name not in live:
+                missing.append(model)
+                continue
+            wanted = _spec(model)
+            if any(live[name].get(option) != wanted.get(option) for option in COMPARED_OPTIONS):
+                conflicting.append(name)
+        
+        extra = [name for name in live if name != '_id_' and name not in registered]
+        
+        report[collection] = {
+            'missing': missing,
+            'conflicting': conflicting,
+            'extra': extra,
+            'redundant': _redundant_indexes(live)
+        }
+    
+    return report
+
+def _redundant_indexes(live):
+    """Indexes whose key is a strict prefix of another index's key"""
+    keys = {
+        name: [tuple(pair) for pair in info['key']]
+        for name, info in live.items()
+        if name != '_id_' and not info.get('unique') and 'expireAfterSeconds' not in info
+    }
+    redundant = []
+    for name, key in keys.items():
+        if any(field == '_fts' for field, _ in key):
+            continue
+        for other_name, other_info in live.items():
+            other_key = [tuple(pair) for pair in other_info['key']]
+            if other_name != name and len(other_key) > len(key) and other_key[:len(key)] == key:
+                redundant.append(f"{name} (covered by {other_name})")
+                break
+    return redundant
+
+def unused_indexes(db):
+    """Indexes with no recorded accesses since the server last restarted"""
+    unused = {}
+    for collection in INDEXES:
+        stats = db[collection].aggregate([{'$indexStats': {}}])
+        names = [
+            stat['name'] for stat in stats
+            if stat['name'] != '_id_' and stat.get('accesses', {}).get('ops', 0) == 0
+        ]
+        if names:
+            unused[collection] = names
+    return unused
+
+def sync_indexes(db):
+    """
+    Build missing indexes, one collection at a time, and record the registry
+    version. A collection that fails (e.g. a unique index over existing
+    duplicates) does not stop the others; its error is stored in the marker
+    and the version is left unrecorded, so the next sync retries only the
+    indexes still missing. Returns (created, failed) per collection.
+    """
+    created = {}
+    failed = {}
+    for collection, entry in diff_indexes(db).items():
+        if not entry['missing']:
+            continue
+        try:
+            created[collection] = db[collection].create_indexes(entry['missing'])
+        except PyMongoError as e:
+            failed[collection] = str(e)
+            print(f"⚠️  Could not build indexes on {collection}: {str(e)}")
+    
+    marker = {'failed': failed, 'syncedAt': datetime.utcnow()}
+    if not failed:
+        marker['version'] = registry_version()
+    db[META_COLLECTION].update_one({'_id': MARKER_ID}, {'$set': marker}, upsert=True)
+    return created, failed
+
+def indexes_current(db):
+    """Check the stored index-version marker against the registry"""
+    marker = db[META_COLLECTION].find_one({'_id': MARKER_ID}, {'version': 1})
+    return bool(marker) and marker.get('version') == registry_version()
+
+def register_index_commands(app):
+    """Register the `flask indexes` CLI group"""
+    from database.db import get_db
+    
+    @app.cli.group('indexes')
+    def indexes_cli():
+        """Manage MongoDB indexes declared in database/indexes.py"""
+        pass
+    
+    @indexes_cli.command('check')
+    def check_command():
+        """Diff the registry against live indexes"""
+        db = get_db()
+        click.echo(f"Registry version: {registry_version()} "
+                   f"({'recorded' if indexes_current(db) else 'not recorded'})")
+        
+        for collection, entry in diff_indexes(db).items():
+            for model in entry['missing']:
+                click.echo(f"  {collection}: missing {model.document['name']}")
+            for name in entry['conflicting']:
+                click.echo(f"  {collection}: options differ on {name}")
+            for name in entry['extra']:
+                click.echo(f"  {collection}: not in registry {name}")
+            for name in entry['redundant']:
+                click.echo(f"  {collection}: redundant {name}")
+    
+    @indexes_cli.command('sync')
+    def sync_command():
+        """Build missing indexes and record the registry version"""
+        created, failed = sync_indexes(get_db())
+        for collection, names in created.items():
+            click.echo(f"  {collection}: created {', '.join(names)}")
+        for collection, error in failed.items():
+            click.echo(f"  {collection}: failed ({error})")
+        if failed:
+            click.echo("⚠️  Indexes partly synced; fix the failures and run `flask indexes sync` again")
+        else:
+            click.echo(f"✅ Indexes synced (version {registry_version()})")
+    
+    @indexes_cli.command('unused')
+    def unused_command():
+        """Report indexes with no accesses according to $indexStats"""
+        unused = unused_indexes(get_db())
+        if not unused:
+            click.echo("No unused indexes")
+        for collection, names in unused.items():
+            click.echo(f"  {collection}: {', '.join(names)}")
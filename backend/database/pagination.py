@@ -0,0 +1,145 @@
+"""Keyset (cursor) pagination helpers"""
+from config import Config
+from bson import json_util
+from bson.objectid import ObjectId
+import base64
+import binascii
+import json
+import threading
+import time
+
+# Page sizes are clamped to this range
+MAX_PAGE_LIMIT = Config.MAX_PAGE_SIZE
+
+def clamp_limit(limit):
+    """Keep a requested page size between 1 and MAX_PAGE_LIMIT"""
+    return max(1, min(int(limit), MAX_PAGE_LIMIT))
+
+def encode_cursor(value, doc_id, sort_field, direction):
+    """Encode a (sort value, _id) position and its ordering as an opaque URL-safe token"""
+    payload = json_util.dumps({'v': value, 'id': str(doc_id), 's': sort_field, 'd': direction})
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort_field=None, direction=None):
+    """
+    Decode a cursor token back into (sort value, ObjectId). Raises ValueError
+    if it was issued for a different sort field or direction.
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json_util.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        value, doc_id = payload['v'], ObjectId(payload['id'])
+    except (binascii.Error, ValueError, KeyError, TypeError, json.JSONDecodeError, UnicodeError):
+        raise ValueError('Invalid cursor')
+    
+    if sort_field is not None and payload.get('s', sort_field) != sort_field:
+        raise ValueError('Cursor does not match the requested sort')
+    if direction is not None and payload.get('d', direction) != direction:
+        raise ValueError('Cursor does not match the requested sort')
+    
+    return value, doc_id
+
+def keyset_query(filters, sort_field, direction, cursor):
+    """
+    Add the "after this position" condition for a cursor to a filter.
+    Null and missing sort values order before every other value, so they
+    come first ascending and last descending; comparison operators never
+    match them and they get their own branches.
+    """
+    if not cursor:
+        return filters
+    
+    value, doc_id = decode_cursor(cursor, sort_field, direction)
+    op = '$lt' if direction < 0 else '$gt'
+    
+    if value is None:
+        after = [{sort_field: None, '_id': {op: doc_id}}]
+        if direction > 0:
+            after.append({sort_field: {'$ne': None}})
+    else:
+        after = [
+            {sort_field: {op: value}},
+            {sort_field: value, '_id': {op: doc_id}}
+        ]
+        if direction < 0:
+            after.append({sort_field: None})
+    
+    after = {'$or': after}
+    return {'$and': [filters, after]} if filters else after
+
+def keyset_page(collection, filters, sort_field, direction, limit, cursor=None, projection=None):
+    """
+    Fetch one page ordered by (sort_field, _id) starting after `cursor`.
+    Returns (documents, next_cursor); next_cursor is None on the last page.
+    """
+    limit = clamp_limit(limit)
+    query = keyset_query(filters, sort_field, direction, cursor)
+    sort = [(sort_field, direction), ('_id', direction)]
+    
+    # Fetch one extra document to know whether another page exists
+    docs = list(collection.find(query, projection).sort(sort).limit(limit + 1))
+    
+    next_cursor = None
+    if len(docs) > limit:
+        docs = docs[:limit]
+        last = docs[-1]
+        next_cursor = encode_cursor(last.get(sort_field), last['_id'], sort_field, direction)
+    
+    return docs, next_cursor
+
+def paginate_by_cursor(collection, filters, limit, cursor, sort_field='createdAt', direction=-1,
+                       include_total=False, count_mode='exact', projection=None):
+    """
+    Cursor-paginate a collection by (sort_field, _id), newest first by default.
+    Returns (documents, metadata) where metadata holds nextCursor/hasMore/limit
+    and, when requested, the total.
+    """
+    limit = clamp_limit(limit)
+    docs, next_cursor = keyset_page(
+        collection, filters, sort_field, direction, limit, cursor, projection
+    )
+    
+    meta = {
+        'nextCursor': next_cursor,
+        'hasMore': next_cursor is not None,
+        'limit': limit
+    }
+    if include_total:
+        meta['total'] = count_documents(collection, filters, count_mode)
+    
+    return docs, meta
+
+# Short-lived cache of count_documents results for large admin listings
+_count_cache = {}
+_count_cache_lock = threading.Lock()
+COUNT_CACHE_TTL = 30
+COUNT_CACHE_MAX_ENTRIES = 1024
+
+def count_documents(collection, filters, mode='exact'):
+    """
+    Count documents matching `filters`.
+    mode='exact' always runs count_documents, 'cached' reuses a result for
+    COUNT_CACHE_TTL seconds, and 'estimated' uses collection metadata for
+    unfiltered counts (falling back to 'cached' otherwise).
+    """
+    if mode == 'estimated' and not filters:
+        return collection.estimated_document_count()
+    if mode == 'exact':
+        return collection.count_documents(filters or {})
+    
+    key = (collection.full_name, json_util.dumps(filters or {}, sort_keys=True))
+    now = time.monotonic()
+    
+    with _count_cache_lock:
+        cached = _count_cache.get(key)
+    if cached and cached[1] > now:
+        return cached[0]
+    
+    total = collection.count_documents(filters or {})
+    
+    with _count_cache_lock:
+        if len(_count_cache) >= COUNT_CACHE_MAX_ENTRIES:
+            _count_cache.clear()
+        _count_cache[key] = (total, now + COUNT_CACHE_TTL)
+    
+    return total
@@ -21,14 +21,14 @@ def token_required(f):
         
         try:
             # Verify token
-            user_id = User.verify_token(token)
-            if not user_id:
+            claims = User.decode_token(token)
+            if not claims:
                 return jsonify({'error': 'Invalid or expired token'}), 401
             
-            # Get user
-            current_user = User.find_by_id(user_id)
+            # Get user (lean principal; handlers load the full document if needed)
+            current_user = User.principal_from_claims(claims)
             if not current_user:
-                return jsonify({'error': 'User not found'}), 401
+                return jsonify({'error': 'User not found or token revoked'}), 401
             
         except Exception as e:
             return jsonify({'error': 'Token verification failed'}), 401
@@ -54,13 +54,14 @@ def admin_required(f):
             return jsonify({'error': 'Authentication token required'}), 401
         
         try:
-            user_id = User.verify_token(token)
-            if not user_id:
+            claims = User.decode_token(token)
+            if not claims:
                 return jsonify({'error': 'Invalid or expired token'}), 401
             
-            current_user = User.find_by_id(user_id)
+            # Role comes from the token claims once its version is current
+            current_user = User.principal_from_claims(claims)
             if not current_user:
-                return jsonify({'error': 'User not found'}), 401
+                return jsonify({'error': 'User not found or token revoked'}), 401
             
             if current_user.get('role') != 'admin':
                 return jsonify({'error': 'Admin access required'}), 403
@@ -83,9 +84,9 @@ def optional_token(f):
             auth_header = request.headers['Authorization']
             try:
                 token = auth_header.split(" ")[1]
-                user_id = User.verify_token(token)
-                if user_id:
-                    current_user = User.find_by_id(user_id)
+                claims = User.decode_token(token)
+                if claims:
+                    current_user = User.principal_from_claims(claims)
             except:
                 pass
         
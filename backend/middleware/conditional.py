@@ -0,0 +1,45 @@
+from flask import request, Response
+from datetime import timezone
+import hashlib
+
+def make_etag(*parts):
+    """Strong ETag value derived from the given version parts"""
+    digest = hashlib.sha1('|'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+    return digest[:32]
+
+def _http_time(last_modified):
+    """Naive UTC datetime -> aware datetime truncated to HTTP-date precision"""
+    if last_modified is None:
+        return None
+    if last_modified.tzinfo is None:
+        last_modified = last_modified.replace(tzinfo=timezone.utc)
+    return last_modified.replace(microsecond=0)
+
+def not_modified(etag, last_modified=None):
+    """
+    Return a 304 response when the request's validators still match,
+    otherwise None so the caller builds the full body.
+    """
+    last_modified = _http_time(last_modified)
+    
+    if request.if_none_match:
+        matched = request.if_none_match.contains(etag)
+    elif request.if_modified_since and last_modified is not None:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+    
+    if not matched:
+        return None
+    
+    response = Response(status=304)
+    return with_validators(response, etag, last_modified)
+
+def with_validators(response, etag, last_modified=None):
+    """Attach ETag / Last-Modified / Cache-Control to a response"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = _http_time(last_modified)
+    # Let browsers and CDNs store the body but revalidate before reuse
+    response.headers['Cache-Control'] = 'public, no-cache'
+    return response
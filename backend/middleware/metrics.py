@@ -0,0 +1,177 @@
+from flask import g, has_request_context, request
+from pymongo import monitoring
+from database.cache import CACHES
+import bson
+import threading
+
+# Upper bounds (seconds) of the command latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+# pymongo keeps registered listeners for the whole process, so one collector
+# serves every app built in it (as /metrics describes the process anyway)
+_metrics = None
+_metrics_lock = threading.Lock()
+
+def _request_labels():
+    """Blueprint/endpoint labels for the command being recorded"""
+    if not has_request_context():
+        return ('none', 'none')
+    return (request.blueprint or 'app', request.endpoint or 'unmatched')
+
+def render_cache_stats():
+    """Prometheus lines for every in-process cache"""
+    stats = {name: cache.stats() for name, cache in sorted(CACHES.items())}
+    lines = []
+    
+    for metric, field, kind, description in (
+        ('cache_hits_total', 'hits', 'counter', 'In-process cache hits.'),
+        ('cache_misses_total', 'misses', 'counter', 'In-process cache misses.'),
+        ('cache_evictions_total', 'evictions', 'counter', 'In-process cache LRU evictions.'),
+        ('cache_entries', 'size', 'gauge', 'Entries currently held by the in-process cache.')
+    ):
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} {kind}']
+        for name, values in stats.items():
+            lines.append(f'{metric}{{cache="{name}"}} {values[field]}')
+    
+    return lines
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Collect per-route MongoDB command counts, latency and reply size"""
+    
+    def __init__(self, measure_reply_bytes=False):
+        # Sizing a reply re-encodes it, so it is opt-in (MONGO_METRICS_REPLY_BYTES)
+        self.measure_reply_bytes = measure_reply_bytes
+        self._lock = threading.Lock()
+        self.commands = {}
+        self.failures = {}
+        self.reply_bytes = {}
+        self.latency = {}
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        reply_size = len(bson.encode(event.reply)) if self.measure_reply_bytes and event.reply else 0
+        self._record(event, reply_size, failed=False)
+    
+    def failed(self, event):
+        self._record(event, 0, failed=True)
+    
+    def _record(self, event, reply_size, failed):
+        blueprint, endpoint = _request_labels()
+        seconds = event.duration_micros / 1e6
+        command_key = (blueprint, endpoint, event.command_name)
+        route_key = (blueprint, endpoint)
+        
+        with self._lock:
+            self.commands[command_key] = self.commands.get(command_key, 0) + 1
+            if failed:
+                self.failures[command_key] = self.failures.get(command_key, 0) + 1
+            self.reply_bytes[route_key] = self.reply_bytes.get(route_key, 0) + reply_size
+            
+            histogram = self.latency.get(route_key)
+            if histogram is None:
+                histogram = self.latency[route_key] = {
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'sum': 0.0,
+                    'count': 0
+                }
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += seconds
+            histogram['count'] += 1
+        
+        if has_request_context() and 'mongo_stats' in g:
+            stats = g.mongo_stats
+            stats['commands'] += 1
+            stats['seconds'] += seconds
+            stats['bytes'] += reply_size
+    
+    def render(self):
+        """Render collected metrics in Prometheus text exposition format"""
+        with self._lock:
+            commands = dict(self.commands)
+            failures = dict(self.failures)
+            reply_bytes = dict(self.reply_bytes)
+            latency = {k: {'buckets': list(v['buckets']), 'sum': v['sum'], 'count': v['count']}
+                       for k, v in self.latency.items()}
+        
+        lines = [
+            '# HELP mongo_commands_total MongoDB commands issued, by route and command.',
+            '# TYPE mongo_commands_total counter'
+        ]
+        for (blueprint, endpoint, command), value in sorted(commands.items()):
+            lines.append(
+                f'mongo_commands_total{{blueprint="{blueprint}",endpoint="{endpoint}",'
+                f'command="{command}"}} {value}'
+            )
+        
+        lines += [
+            '# HELP mongo_command_failures_total MongoDB commands that failed, by route and command.',
+            '# TYPE mongo_command_failures_total counter'
+        ]
+        for (blueprint, endpoint, command), value in sorted(failures.items()):
+            lines.append(
+                f'mongo_command_failures_total{{blueprint="{blueprint}",endpoint="{endpoint}",'
+                f'command="{command}"}} {value}'
+            )
+        
+        if self.measure_reply_bytes:
+            lines += [
+                '# HELP mongo_reply_bytes_total Bytes returned by MongoDB, by route.',
+                '# TYPE mongo_reply_bytes_total counter'
+            ]
+            for (blueprint, endpoint), value in sorted(reply_bytes.items()):
+                lines.append(
+                    f'mongo_reply_bytes_total{{blueprint="{blueprint}",endpoint="{endpoint}"}} {value}'
+                )
+        
+        lines += [
+            '# HELP mongo_command_duration_seconds MongoDB command latency, by route.',
+            '# TYPE mongo_command_duration_seconds histogram'
+        ]
+        for (blueprint, endpoint), histogram in sorted(latency.items()):
+            labels = f'blueprint="{blueprint}",endpoint="{endpoint}"'
+            for bound, value in zip(LATENCY_BUCKETS, histogram['buckets']):
+                lines.append(f'mongo_command_duration_seconds_bucket{{{labels},le="{bound}"}} {value}')
+            lines.append(
+                f'mongo_command_duration_seconds_bucket{{{labels},le="+Inf"}} {histogram["count"]}'
+            )
+            lines.append(f'mongo_command_duration_seconds_sum{{{labels}}} {histogram["sum"]:.6f}')
+            lines.append(f'mongo_command_duration_seconds_count{{{labels}}} {histogram["count"]}')
+        
+        lines += render_cache_stats()
+        
+        return '\n'.join(lines) + '\n'
+
+def init_metrics(app):
+    """Register the MongoDB command listener (once per process) and per-request stats hooks"""
+    global _metrics
+    
+    # Global registration applies to every MongoClient created afterwards,
+    # so this must run before the first get_db() call.
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = MongoCommandMetrics()
+            monitoring.register(_metrics)
+        metrics = _metrics
+    metrics.measure_reply_bytes = app.config.get('MONGO_METRICS_REPLY_BYTES', False)
+    app.extensions['mongo_metrics'] = metrics
+    
+    @app.before_request
+    def start_mongo_stats():
+        g.mongo_stats = {'commands': 0, 'seconds': 0.0, 'bytes': 0}
+    
+    @app.after_request
+    def add_mongo_stats_header(response):
+        stats = g.get('mongo_stats')
+        if app.debug and stats is not None:
+            response.headers['X-Mongo-Stats'] = (
+                f"commands={stats['commands']}; "
+                f"time_ms={stats['seconds'] * 1000:.2f}"
+                + (f"; bytes={stats['bytes']}" if metrics.measure_reply_bytes else '')
+            )
+        return response
+    
+    return metrics
@@ -0,0 +1,151 @@
+from flask import current_app, g, has_request_context, request
+from pymongo import monitoring
+import os
+import threading
+import traceback
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# pymongo keeps registered listeners for the whole process, so one detector
+# serves every app built in it (the shapes it records live in flask.g)
+_detector = None
+_detector_lock = threading.Lock()
+
+# Commands whose repetition within one request is worth reporting
+WATCHED_COMMANDS = {'find', 'aggregate', 'count', 'distinct', 'update', 'delete', 'findAndModify'}
+
+class NPlusOneError(AssertionError):
+    """Raised in testing when a request repeats a query shape too often"""
+    pass
+
+def query_shape(value):
+    """Replace literal values with placeholders, keeping the query structure"""
+    if isinstance(value, dict):
+        return tuple(sorted((k, query_shape(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return ('[]', query_shape(value[0])) if value else ('[]',)
+    return '?'
+
+def _command_filter(command_name, command):
+    """Extract the part of a command that identifies its shape"""
+    if command_name == 'find':
+        return command.get('filter', {})
+    if command_name == 'aggregate':
+        return command.get('pipeline', [])
+    if command_name in ('count', 'distinct'):
+        return command.get('query', {})
+    if command_name == 'findAndModify':
+        return command.get('query', {})
+    if command_name == 'update':
+        return [u.get('q', {}) for u in command.get('updates', [])[:1]]
+    if command_name == 'delete':
+        return [d.get('q', {}) for d in command.get('deletes', [])[:1]]
+    return {}
+
+def _call_site():
+    """Innermost application frame that issued the command"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if not filename.startswith(BACKEND_ROOT) or 'site-packages' in filename:
+            continue
+        if filename.startswith(os.path.join(BACKEND_ROOT, 'middleware', 'n_plus_one')):
+            continue
+        return f"{os.path.relpath(filename, BACKEND_ROOT)}:{frame.lineno} in {frame.name}"
+    return 'unknown'
+
+class NPlusOneDetector(monitoring.CommandListener):
+    """Track repeated same-shape queries issued within a single request"""
+    
+    def started(self, event):
+        if event.command_name not in WATCHED_COMMANDS:
+            return
+        if not has_request_context() or 'mongo_query_shapes' not in g:
+            return
+        
+        collection = event.command.get(event.command_name)
+        shape = (
+            event.command_name,
+            collection,
+            query_shape(_command_filter(event.command_name, event.command))
+        )
+        
+        entry = g.mongo_query_shapes.get(shape)
+        if entry is None:
+            entry = g.mongo_query_shapes[shape] = {'count': 0, 'sites': {}}
+        entry['count'] += 1
+        site = _call_site()
+        entry['sites'][site] = entry['sites'].get(site, 0) + 1
+    
+    def succeeded(self, event):
+        pass
+    
+    def failed(self, event):
+        pass
+
+def find_repeated_queries(shapes, threshold):
+    """Return query shapes repeated at least `threshold` times"""
+    repeated = []
+    for (command_name, collection, _), entry in shapes.items():
+        if entry['count'] >= threshold:
+            repeated.append({
+                'command': command_name,
+                'collection': collection,
+                'count': entry['count'],
+                'sites': entry['sites']
+            })
+    return sorted(repeated, key=lambda r: r['count'], reverse=True)
+
+def init_n_plus_one_detector(app):
+    """Register the N+1 detector (once per process) and its request hooks"""
+    global _detector
+    with _detector_lock:
+        if _detector is None:
+            _detector = NPlusOneDetector()
+            monitoring.register(_detector)
+        detector = _detector
+    
+    def detection_enabled():
+        return (
+            app.debug or app.testing
+            or current_app.config.get('MONGO_N_PLUS_ONE_DETECTION', False)
+        )
+    
+    @app.before_request
+    def start_query_shapes():
+        if detection_enabled():
+            g.mongo_query_shapes = {}
+    
+    @app.after_request
+    def report_repeated_queries(response):
+        shapes = g.get('mongo_query_shapes')
+        if not shapes:
+            return response
+        
+        threshold = app.config.get('MONGO_N_PLUS_ONE_THRESHOLD', 3)
+        repeated = find_repeated_queries(shapes, threshold)
+        if not repeated:
+            return response
+        
+        for item in repeated:
+            sites = ', '.join(f"{site} (x{count})" for site, count in item['sites'].items())
+            app.logger.warning(
+                f"N+1 query: {item['command']} on '{item['collection']}' repeated "
+                f"{item['count']} times in {request.endpoint} at {sites}"
+            )
+        
+        if app.debug:
+            response.headers['X-Mongo-N-Plus-One'] = '; '.join(
+                f"{item['command']}:{item['collection']}x{item['count']}" for item in repeated
+            )
+        
+        # On by default in TestingConfig; MONGO_N_PLUS_ONE_RAISE=False turns it off
+        if app.config.get('MONGO_N_PLUS_ONE_RAISE', False):
+            worst = repeated[0]
+            raise NPlusOneError(
+                f"{worst['command']} on '{worst['collection']}' repeated {worst['count']} times "
+                f"(threshold {threshold}) at {', '.join(worst['sites'])}"
+            )
+        
+        return response
+    
+    return detector
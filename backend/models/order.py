@@ -1,4 +1,6 @@
 from database.db import get_db
+from database.pagination import count_documents, paginate_by_cursor
+from pymongo import ReturnDocument
 from bson.objectid import ObjectId
 from datetime import datetime
 import random
@@ -65,10 +67,16 @@ class Order:
         return Order.format_order(order) if order else None
     
     @staticmethod
-    def find_by_user(user_id, page=1, limit=10):
-        """Find orders by user ID"""
+    def find_by_user(user_id, page=1, limit=10, cursor=None, include_total=True):
+        """Find orders by user ID (keyset-paginated when `cursor` is given)"""
         db = get_db()
         
+        if cursor is not None:
+            orders, meta = paginate_by_cursor(
+                db.orders, {'userId': user_id}, limit, cursor, include_total=include_total
+            )
+            return {'orders': [Order.format_order(o) for o in orders], **meta}
+        
         skip = (page - 1) * limit
         
         orders = list(db.orders.find(
@@ -85,15 +93,23 @@ class Order:
         }
     
     @staticmethod
-    def find_all(filters=None, page=1, limit=20):
-        """Find all orders with pagination"""
+    def find_all(filters=None, page=1, limit=20, cursor=None, include_total=True):
+        """Find all orders with pagination (keyset-paginated when `cursor` is given)"""
         db = get_db()
         
         query = filters or {}
+        
+        if cursor is not None:
+            orders, meta = paginate_by_cursor(
+                db.orders, query, limit, cursor,
+                include_total=include_total, count_mode='estimated'
+            )
+            return {'orders': [Order.format_order(o) for o in orders], **meta}
+        
         skip = (page - 1) * limit
         
-        orders = list(db.orders.find(query).sort('createdAt', -1).skip(skip).limit(limit))
-        total = db.orders.count_documents(query)
+        orders = list(db.orders.find(query).sort([('createdAt', -1), ('_id', -1)]).skip(skip).limit(limit))
+        total = count_documents(db.orders, query, 'estimated')
         
         return {
             'orders': [Order.format_order(o) for o in orders],
@@ -113,7 +129,7 @@ class Order:
             'note': note
         }
         
-        db.orders.update_one(
+        order = db.orders.find_one_and_update(
             {'_id': ObjectId(order_id)},
             {
                 '$set': {
@@ -121,41 +137,44 @@ class Order:
                     'updatedAt': datetime.utcnow()
                 },
                 '$push': {'statusHistory': status_update}
-            }
+            },
+            return_document=ReturnDocument.AFTER
         )
         
-        return Order.find_by_id(order_id)
+        return Order.format_order(order)
     
     @staticmethod
     def update_payment_status(order_id, payment_status):
         """Update payment status"""
         db = get_db()
         
-        db.orders.update_one(
+        order = db.orders.find_one_and_update(
             {'_id': ObjectId(order_id)},
             {'$set': {
                 'paymentStatus': payment_status,
                 'updatedAt': datetime.utcnow()
-            }}
+            }},
+            return_document=ReturnDocument.AFTER
         )
         
-        return Order.find_by_id(order_id)
+        return Order.format_order(order)
     
     @staticmethod
     def add_tracking(order_id, tracking_number, carrier=None):
         """Add tracking information"""
         db = get_db()
         
-        db.orders.update_one(
+        order = db.orders.find_one_and_update(
             {'_id': ObjectId(order_id)},
             {'$set': {
                 'trackingNumber': tracking_number,
                 'trackingCarrier': carrier,
                 'updatedAt': datetime.utcnow()
-            }}
+            }},
+            return_document=ReturnDocument.AFTER
         )
         
-        return Order.find_by_id(order_id)
+        return Order.format_order(order)
     
     @staticmethod
     def format_order(order):
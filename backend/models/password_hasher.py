@@ -0,0 +1,121 @@
+"""Password hashing on a bounded per-worker process pool"""
+from config import Config
+from werkzeug.security import generate_password_hash, check_password_hash, DEFAULT_PBKDF2_ITERATIONS
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+import atexit
+import multiprocessing
+import os
+import threading
+
+class HasherBusy(Exception):
+    """Raised when too many hashes are queued; callers answer 503"""
+    pass
+
+def _method_prefix(method):
+    """
+    The method part werkzeug writes in front of a hash ("scrypt:32768:8:1"),
+    with short methods ("scrypt", "pbkdf2") expanded to werkzeug's defaults
+    """
+    name, *args = method.split(':')
+    if name == 'scrypt' and not args:
+        return f"scrypt:{2 ** 15}:8:1"
+    if name == 'pbkdf2' and len(args) < 2:
+        hash_name = args[0] if args else 'sha256'
+        return f"pbkdf2:{hash_name}:{DEFAULT_PBKDF2_ITERATIONS}"
+    return method
+
+class PasswordHasher:
+    """
+    Runs werkzeug hashing in a process pool so a burst of logins cannot
+    occupy the request threads (or the GIL). At most `workers + max_queue`
+    hashes may be in flight per worker process; beyond that callers get
+    HasherBusy immediately instead of queueing behind a growing backlog.
+    With workers = 0 hashing runs inline.
+    """
+    
+    def __init__(self, method, workers, max_queue, timeout):
+        self._lock = threading.Lock()
+        self._pool = None
+        self._pid = None
+        self.configure(method, workers, max_queue, timeout)
+    
+    def configure(self, method=None, workers=None, max_queue=None, timeout=None):
+        """Change hash parameters or pool size; the pool is rebuilt on next use"""
+        with self._lock:
+            if method is not None:
+                self.method = method
+                self._prefix = _method_prefix(method)
+            if workers is not None:
+                self.workers = workers
+            if max_queue is not None:
+                self.max_queue = max_queue
+            if timeout is not None:
+                self.timeout = timeout
+            self._slots = threading.BoundedSemaphore(max(self.workers + self.max_queue, 1))
+            self._shutdown_pool(wait=False)
+    
+    def _shutdown_pool(self, wait):
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+        self._pool = None
+    
+    def _get_pool(self):
+        """Pool for this process, created lazily so forked workers get their own"""
+        if self._pool is not None and self._pid == os.getpid():
+            return self._pool
+        
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                # Spawned, not forked: forking a process that runs request
+                # threads can copy locks held by those threads into the child
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+                self._pid = os.getpid()
+            return self._pool
+    
+    def _run(self, fn, *args):
+        if self.workers <= 0:
+            return fn(*args)
+        
+        slots = self._slots
+        if not slots.acquire(blocking=False):
+            raise HasherBusy('Password hashing queue is full')
+        
+        try:
+            future = self._get_pool().submit(fn, *args)
+        except Exception:
+            slots.release()
+            raise
+        future.add_done_callback(lambda _: slots.release())
+        
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            raise HasherBusy('Password hashing timed out')
+    
+    def hash(self, password):
+        """Hash a password with the configured method"""
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, stored_password, provided_password):
+        """Check a password against a stored hash (any method werkzeug knows)"""
+        return self._run(check_password_hash, stored_password, provided_password)
+    
+    def needs_rehash(self, stored_password):
+        """True when a stored hash was made with different parameters (no hashing)"""
+        return stored_password.split('$', 1)[0] != self._prefix
+    
+    def shutdown(self):
+        """Stop this process's pool"""
+        with self._lock:
+            self._shutdown_pool(wait=True)
+
+hasher = PasswordHasher(
+    Config.PASSWORD_HASH_METHOD,
+    Config.PASSWORD_HASH_WORKERS,
+    Config.PASSWORD_HASH_MAX_QUEUE,
+    Config.PASSWORD_HASH_TIMEOUT
+)
+atexit.register(hasher.shutdown)
@@ -1,10 +1,74 @@
 from database.db import get_db
+from database.pagination import paginate_by_cursor
+from database.cache import LRUCache
+from database.change_streams import subscribe
+from models.search_index import search_index, INDEXED_FIELDS
+from models.stock_hold import StockHold
+from models.stock_shard import StockShards
+from config import Config
+from pymongo import UpdateOne, ReturnDocument
+from bson import json_util
 from bson.objectid import ObjectId
 from datetime import datetime
+import click
+
+# Per-worker catalog caches: single products keyed by id/slug, and listing pages
+# keyed by their normalized query. Every product write invalidates them.
+catalog_cache = LRUCache('catalog', Config.CATALOG_CACHE_MAX_SIZE, Config.CATALOG_CACHE_TTL)
+listing_cache = LRUCache('catalog_listing', Config.CATALOG_CACHE_MAX_SIZE, Config.CATALOG_CACHE_TTL)
+search_cache = LRUCache('catalog_search', Config.SEARCH_CACHE_MAX_SIZE, Config.CATALOG_CACHE_TTL)
 
 class Product:
     """Product model for managing products"""
     
+    # Fields the catalog can be sorted (and cursor-paginated) by
+    SORT_FIELDS = ('createdAt', 'price', 'averageRating', 'name')
+    
+    # Lower bounds of the price histogram buckets; the last bucket is open-ended
+    PRICE_BUCKETS = [0, 10, 15, 20, 30, 50]
+    
+    RATING_STARS = (1, 2, 3, 4, 5)
+    
+    # Internal bookkeeping fields never needed to format a product
+    PROJECTION = {'stockReservations': 0}
+    
+    @staticmethod
+    def invalidate_cache(product_id=None):
+        """Drop cached entries for a product (all products when no id), all listings and searches"""
+        if product_id is None:
+            catalog_cache.clear()
+        else:
+            product_id = str(product_id)
+            catalog_cache.delete_where(lambda key, value: value['id'] == product_id)
+        listing_cache.clear()
+        search_cache.clear()
+    
+    @staticmethod
+    def catalog_version():
+        """
+        Latest product updatedAt, used as the catalog's version for ETags.
+        Cached alongside listings so it is dropped by every product write.
+        """
+        cached = listing_cache.get('catalog_version')
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        db = get_db()
+        latest = db.products.find_one(
+            {}, {'updatedAt': 1}, sort=[('updatedAt', -1)]
+        )
+        version = latest.get('updatedAt') if latest else None
+        listing_cache.set('catalog_version', version)
+        return version
+    
+    @staticmethod
+    def _cache_product(product):
+        """Store a formatted product under its id and slug"""
+        if product:
+            catalog_cache.set(('id', product['id']), product)
+            catalog_cache.set(('slug', product['slug']), product)
+        return product
+    
     @staticmethod
     def create(product_data):
         """Create a new product"""
@@ -16,26 +80,59 @@ class Product:
         
         product_data['createdAt'] = datetime.utcnow()
         product_data['updatedAt'] = datetime.utcnow()
-        product_data['averageRating'] = 0
-        product_data['totalReviews'] = 0
+        product_data.update(Product._rating_aggregates({}))
         product_data['isActive'] = product_data.get('isActive', True)
         
         result = db.products.insert_one(product_data)
         product_data['_id'] = result.inserted_id
         
+        Product.invalidate_cache(result.inserted_id)
+        search_index.mark_dirty(result.inserted_id)
+        
         return Product.format_product(product_data)
     
     @staticmethod
-    def find_all(filters=None, page=1, limit=20, sort=None):
-        """Find all products with pagination and filters"""
+    def find_all(filters=None, page=1, limit=20, sort=None, cursor=None, include_total=True):
+        """
+        Find all products with pagination and filters.
+        Pass `cursor` (an empty string for the first page) to use keyset
+        pagination instead of page numbers.
+        """
         db = get_db()
         
         query = filters or {}
-        skip = (page - 1) * limit
         
         # Default sort by createdAt descending
         sort_by = sort or [('createdAt', -1)]
         
+        cache_key = json_util.dumps(
+            [query, sort_by, page, limit, cursor, include_total], sort_keys=True
+        )
+        cached = listing_cache.get(cache_key)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        result = Product._find_all(db, query, page, limit, sort_by, cursor, include_total)
+        listing_cache.set(cache_key, result)
+        return result
+    
+    @staticmethod
+    def _find_all(db, query, page, limit, sort_by, cursor, include_total):
+        """Uncached body of find_all"""
+        if cursor is not None:
+            sort_field, direction = sort_by[0]
+            if sort_field not in Product.SORT_FIELDS:
+                raise ValueError(f'Cannot paginate by cursor on {sort_field}')
+            
+            products, meta = paginate_by_cursor(
+                db.products, query, limit, cursor,
+                sort_field=sort_field, direction=direction, include_total=include_total
+            )
+            
+            return {'products': [Product.format_product(p) for p in products], **meta}
+        
+        skip = (page - 1) * limit
+        
         products = list(db.products.find(query).sort(sort_by).skip(skip).limit(limit))
         total = db.products.count_documents(query)
         
@@ -46,19 +143,133 @@ class Product:
             'pages': (total + limit - 1) // limit
         }
     
+    @staticmethod
+    def find_with_facets(filters=None, page=1, limit=20, sort=None):
+        """
+        Find a page of products together with total, category counts, tag
+        counts and a price histogram, all in one $facet aggregation.
+        """
+        query = filters or {}
+        sort_by = sort or [('createdAt', -1)]
+        
+        cache_key = json_util.dumps(['facets', query, sort_by, page, limit], sort_keys=True)
+        cached = listing_cache.get(cache_key)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        db = get_db()
+        skip = (page - 1) * limit
+        sort_stage = dict(sort_by)
+        sort_stage.setdefault('_id', sort_by[0][1])
+        
+        pipeline = [
+            {'$match': query},
+            {'$facet': {
+                'products': [
+                    {'$sort': sort_stage},
+                    {'$skip': skip},
+                    {'$limit': limit}
+                ],
+                'total': [{'$count': 'count'}],
+                'categories': [
+                    {'$group': {'_id': '$category', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1, '_id': 1}}
+                ],
+                'tags': [
+                    {'$unwind': '$tags'},
+                    {'$group': {'_id': '$tags', 'count': {'$sum': 1}}},
+                    {'$sort': {'count': -1, '_id': 1}}
+                ],
+                'priceRanges': [
+                    {'$bucket': {
+                        'groupBy': '$price',
+                        'boundaries': Product.PRICE_BUCKETS + [float('inf')],
+                        'default': 'other',
+                        'output': {'count': {'$sum': 1}}
+                    }}
+                ]
+            }}
+        ]
+        
+        facets = next(db.products.aggregate(pipeline), {})
+        total = facets['total'][0]['count'] if facets.get('total') else 0
+        
+        bounds = Product.PRICE_BUCKETS + [None]
+        price_ranges = []
+        for bucket in facets.get('priceRanges', []):
+            if bucket['_id'] == 'other':
+                continue
+            upper = bounds[bounds.index(bucket['_id']) + 1]
+            price_ranges.append({'min': bucket['_id'], 'max': upper, 'count': bucket['count']})
+        
+        result = {
+            'products': [Product.format_product(p) for p in facets.get('products', [])],
+            'total': total,
+            'page': page,
+            'pages': (total + limit - 1) // limit,
+            'facets': {
+                'categories': [
+                    {'value': c['_id'], 'count': c['count']} for c in facets.get('categories', [])
+                ],
+                'tags': [
+                    {'value': t['_id'], 'count': t['count']} for t in facets.get('tags', [])
+                ],
+                'priceRanges': price_ranges
+            }
+        }
+        
+        listing_cache.set(cache_key, result)
+        return result
+    
     @staticmethod
     def find_by_id(product_id):
         """Find product by ID"""
+        cached = catalog_cache.get(('id', str(product_id)))
+        if cached is not LRUCache.MISSING:
+            return cached
+        
         db = get_db()
-        product = db.products.find_one({'_id': ObjectId(product_id)})
-        return Product.format_product(product) if product else None
+        product = db.products.find_one({'_id': ObjectId(product_id)}, Product.PROJECTION)
+        return Product._cache_product(Product.format_product(product)) if product else None
+    
+    @staticmethod
+    def find_many(product_ids):
+        """
+        Find several products by ID in one query, serving cached ones from
+        the catalog cache. Returns (products in input order, missing ids).
+        """
+        ids = list(dict.fromkeys(str(product_id) for product_id in product_ids))
+        
+        found = {}
+        to_fetch = []
+        for product_id in ids:
+            cached = catalog_cache.get(('id', product_id))
+            if cached is not LRUCache.MISSING:
+                found[product_id] = cached
+            elif ObjectId.is_valid(product_id):
+                to_fetch.append(ObjectId(product_id))
+        
+        if to_fetch:
+            db = get_db()
+            for product in db.products.find({'_id': {'$in': to_fetch}}, Product.PROJECTION):
+                formatted = Product._cache_product(Product.format_product(product))
+                found[formatted['id']] = formatted
+        
+        products = [found[product_id] for product_id in ids if product_id in found]
+        missing = [product_id for product_id in ids if product_id not in found]
+        
+        return products, missing
     
     @staticmethod
     def find_by_slug(slug):
         """Find product by slug"""
+        cached = catalog_cache.get(('slug', slug))
+        if cached is not LRUCache.MISSING:
+            return cached
+        
         db = get_db()
         product = db.products.find_one({'slug': slug})
-        return Product.format_product(product) if product else None
+        return Product._cache_product(Product.format_product(product)) if product else None
     
     @staticmethod
     def update(product_id, update_data):
@@ -67,12 +278,24 @@ class Product:
         
         update_data['updatedAt'] = datetime.utcnow()
         
-        db.products.update_one(
+        # Sharded stock is set through its counters and consolidated back
+        shards = StockShards.shard_count(product_id) if 'stock' in update_data else 0
+        if shards:
+            StockShards.set_total(product_id, int(update_data.pop('stock')), shards)
+            StockShards.consolidate()
+        
+        product = db.products.find_one_and_update(
             {'_id': ObjectId(product_id)},
-            {'$set': update_data}
+            {'$set': update_data},
+            projection=Product.PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return Product.find_by_id(product_id)
+        Product.invalidate_cache(product_id)
+        if any(field in update_data for field in INDEXED_FIELDS):
+            search_index.mark_dirty(product_id)
+        
+        return Product._cache_product(Product.format_product(product)) if product else None
     
     @staticmethod
     def delete(product_id):
@@ -84,73 +307,407 @@ class Product:
             {'$set': {'isActive': False, 'updatedAt': datetime.utcnow()}}
         )
         
+        Product.invalidate_cache(product_id)
+        search_index.mark_dirty(product_id)
+        
         return True
     
     @staticmethod
-    def update_rating(product_id, new_rating, increment=True):
-        """Update product rating"""
+    def _rating_aggregates(histogram):
+        """Aggregate fields for a {star: count} histogram"""
+        counts = {str(star): histogram.get(star, 0) for star in Product.RATING_STARS}
+        total = sum(counts.values())
+        rating_sum = sum(star * counts[str(star)] for star in Product.RATING_STARS)
+        return {
+            'ratingSum': rating_sum,
+            'ratingCount': total,
+            'ratingHistogram': counts,
+            'averageRating': round(rating_sum / total, 2) if total else 0,
+            'totalReviews': total
+        }
+    
+    @staticmethod
+    def update_rating(product_id, added=None, removed=None):
+        """
+        Apply a review change to the product's rating aggregates with one
+        atomic $inc: `added` is a new (or edited-to) rating and `removed` a
+        deleted (or edited-from) one. averageRating/totalReviews are then
+        derived from the counters, guarded so an older result never
+        overwrites one computed after a later review.
+        """
         db = get_db()
-        product = db.products.find_one({'_id': ObjectId(product_id)})
         
-        if not product:
-            return None
+        inc = {'ratingSum': 0, 'ratingCount': 0}
+        for rating, sign in ((added, 1), (removed, -1)):
+            if rating is not None:
+                rating = int(rating)
+                inc['ratingSum'] += sign * rating
+                inc['ratingCount'] += sign
+                key = f'ratingHistogram.{rating}'
+                inc[key] = inc.get(key, 0) + sign
         
-        total_reviews = product.get('totalReviews', 0)
-        avg_rating = product.get('averageRating', 0)
+        product = db.products.find_one_and_update(
+            {'_id': ObjectId(product_id), 'ratingCount': {'$exists': True}},
+            {'$inc': inc},
+            projection={'ratingSum': 1, 'ratingCount': 1},
+            return_document=ReturnDocument.AFTER
+        )
         
-        if increment:
-            new_total = total_reviews + 1
-            new_avg = ((avg_rating * total_reviews) + new_rating) / new_total
+        if product is None:
+            # Products created before rating aggregates existed start from the reviews
+            Product.rebuild_rating_aggregates([product_id])
         else:
-            new_total = max(0, total_reviews - 1)
-            if new_total > 0:
-                new_avg = ((avg_rating * total_reviews) - new_rating) / new_total
-            else:
-                new_avg = 0
+            count = product['ratingCount']
+            db.products.update_one(
+                {'_id': product['_id'], 'ratingSum': product['ratingSum'], 'ratingCount': count},
+                {'$set': {
+                    'averageRating': round(product['ratingSum'] / count, 2) if count > 0 else 0,
+                    'totalReviews': max(count, 0),
+                    'updatedAt': datetime.utcnow()
+                }}
+            )
         
-        db.products.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$set': {
-                'averageRating': round(new_avg, 2),
-                'totalReviews': new_total,
-                'updatedAt': datetime.utcnow()
-            }}
-        )
+        Product.invalidate_cache(product_id)
         
         return Product.find_by_id(product_id)
     
+    @staticmethod
+    def rebuild_rating_aggregates(product_ids=None):
+        """
+        Recompute rating aggregates from the reviews collection in one
+        aggregation pass, for the given products or all of them. Returns
+        the number of products written.
+        """
+        db = get_db()
+        
+        match = {'productId': {'$in': [str(i) for i in product_ids]}} if product_ids else {}
+        histograms = {}
+        for row in db.reviews.aggregate([
+            {'$match': match},
+            {'$group': {'_id': {'productId': '$productId', 'rating': '$rating'}, 'count': {'$sum': 1}}}
+        ]):
+            try:
+                star = int(row['_id']['rating'])
+            except (TypeError, ValueError):
+                continue
+            if star in Product.RATING_STARS:
+                histogram = histograms.setdefault(row['_id']['productId'], {})
+                histogram[star] = histogram.get(star, 0) + row['count']
+        
+        if product_ids:
+            targets = [str(i) for i in product_ids]
+        else:
+            # Products whose reviews are all gone must be reset too
+            targets = set(histograms)
+            targets.update(
+                str(product['_id'])
+                for product in db.products.find({'totalReviews': {'$gt': 0}}, {'_id': 1})
+            )
+        
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                {'_id': ObjectId(product_id)},
+                {'$set': {**Product._rating_aggregates(histograms.get(product_id, {})), 'updatedAt': now}}
+            )
+            for product_id in targets
+            if ObjectId.is_valid(product_id)
+        ]
+        if operations:
+            db.products.bulk_write(operations, ordered=False)
+            Product.invalidate_cache()
+        
+        return len(operations)
+    
     @staticmethod
     def update_stock(product_id, quantity):
         """Update product stock"""
         db = get_db()
         
-        db.products.update_one(
-            {'_id': ObjectId(product_id)},
-            {'$inc': {'stock': quantity}, '$set': {'updatedAt': datetime.utcnow()}}
+        product = db.products.find_one_and_update(
+            {'_id': ObjectId(product_id), 'stockShards': None},
+            {'$inc': {'stock': quantity}, '$set': {'updatedAt': datetime.utcnow()}},
+            projection=Product.PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
+        Product.invalidate_cache(product_id)
+        
+        if product:
+            return Product._cache_product(Product.format_product(product))
+        
+        shards = StockShards.shard_count(product_id)
+        if shards:
+            if quantity >= 0:
+                StockShards.give(product_id, quantity, shards)
+            elif not StockShards.take(product_id, -quantity, shards):
+                raise ValueError('Insufficient stock')
+            StockShards.consolidate()
+            Product.invalidate_cache(product_id)
+        
         return Product.find_by_id(product_id)
     
     @staticmethod
-    def search(query, page=1, limit=20):
-        """Search products by text"""
+    def set_stock_shards(product_id, shards):
+        """
+        Split a product's stock across `shards` counters, or fold them back
+        into products.stock when shards <= 1. Returns False if not found.
+        """
+        if shards > 1:
+            found = StockShards.enable(product_id, shards)
+            StockShards.consolidate()
+        else:
+            found = StockShards.disable(product_id) or Product.find_by_id(product_id) is not None
+        
+        Product.invalidate_cache(product_id)
+        return found
+    
+    @staticmethod
+    def _quantities_by_product(items):
+        """Sum line quantities per product id, validating them"""
+        quantities = {}
+        for item in items:
+            product_id = str(item['productId'])
+            quantity = item['quantity']
+            if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity <= 0:
+                raise ValueError(f'Invalid quantity for product {product_id}')
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+        return quantities
+    
+    @staticmethod
+    def _reservable(product_id, quantity, held=None):
+        """
+        Filter matching a product that can give up `quantity` units from
+        products.stock (sharded products never match; see StockShards)
+        """
+        if held is None:
+            return {'_id': ObjectId(product_id), 'stockShards': None, 'stock': {'$gte': quantity}}
+        
+        # Units the buyer holds are already counted in heldStock
+        required = quantity - held.get(product_id, 0)
+        return {'_id': ObjectId(product_id), 'stockShards': None,
+                '$expr': StockHold.available_expr(required)}
+    
+    @staticmethod
+    def _available(product, product_id, held=None):
+        """Units of a product the buyer could reserve"""
+        if held is None:
+            return product.get('stock', 0)
+        return product.get('stock', 0) - product.get('heldStock', 0) + held.get(product_id, 0)
+    
+    @staticmethod
+    def reserve_stock(items, held=None):
+        """
+        Atomically decrement stock for every line of an order in one
+        bulk_write of conditional updates (stock >= quantity). If any line
+        cannot be reserved, lines that were decremented are restored and
+        the lines that fell short are returned; an empty list means success.
+        
+        With cart holds enabled, `held` maps productId -> quantity the buyer
+        already holds, and only stock not held by other carts is available.
+        Products with sharded stock do not match the bulk update and are
+        taken from their shards afterwards.
+        """
+        db = get_db()
+        quantities = Product._quantities_by_product(items)
+        
+        invalid = [product_id for product_id in quantities if not ObjectId.is_valid(product_id)]
+        if invalid:
+            return [{'productId': product_id, 'name': None, 'requested': quantities[product_id],
+                     'available': 0, 'found': False} for product_id in invalid]
+        
+        # Tag each decrement so a partial failure can undo exactly what it
+        # took. The tag stays until this call removes it, whatever the outcome.
+        token = ObjectId()
+        now = datetime.utcnow()
+        operations = [
+            UpdateOne(
+                Product._reservable(product_id, quantity, held),
+                {
+                    '$inc': {'stock': -quantity},
+                    '$set': {'updatedAt': now},
+                    '$push': {'stockReservations': token}
+                }
+            )
+            for product_id, quantity in quantities.items()
+        ]
+        
+        result = db.products.bulk_write(operations, ordered=False)
+        
+        for product_id in quantities:
+            Product.invalidate_cache(product_id)
+        
+        if result.modified_count == len(operations):
+            Product._clear_reservation(quantities, token)
+            return []
+        
+        current = {
+            str(product['_id']): product
+            for product in db.products.find(
+                {'_id': {'$in': [ObjectId(product_id) for product_id in quantities]}},
+                {'name': 1, 'stock': 1, 'heldStock': 1, 'stockShards': 1, 'stockReservations': 1}
+            )
+        }
+        applied = {
+            product_id for product_id, product in current.items()
+            if token in product.get('stockReservations', [])
+        }
+        
+        # Unsharded lines that were not applied failed their stock check.
+        # If none did, sharded lines go to their counters, stopping at the
+        # first one that cannot be covered.
+        failed = [
+            product_id for product_id in quantities
+            if product_id not in applied and not (current.get(product_id) or {}).get('stockShards')
+        ]
+        taken = []
+        if not failed:
+            for product_id, quantity in quantities.items():
+                if product_id in applied:
+                    continue
+                shards = current[product_id]['stockShards']
+                if not StockShards.take(product_id, quantity, shards):
+                    failed.append(product_id)
+                    break
+                taken.append((product_id, quantity, shards))
+            else:
+                Product._clear_reservation(applied, token)
+                return []
+        
+        # Compensate: give back stock only where this reservation was applied
+        if applied:
+            db.products.bulk_write([
+                UpdateOne(
+                    {'_id': ObjectId(product_id), 'stockReservations': token},
+                    {
+                        '$inc': {'stock': quantity},
+                        '$pull': {'stockReservations': token},
+                        '$set': {'updatedAt': datetime.utcnow()}
+                    }
+                )
+                for product_id, quantity in quantities.items()
+                if product_id in applied
+            ], ordered=False)
+        for product_id, quantity, shards in taken:
+            StockShards.give(product_id, quantity, shards)
+        
+        sharded = [product_id for product_id, product in current.items() if product.get('stockShards')]
+        if sharded:
+            shard_totals = StockShards.totals(sharded)
+            for product_id in sharded:
+                current[product_id]['stock'] = shard_totals.get(product_id, 0)
+        
+        # Report the lines that failed, plus sharded lines that were never
+        # tried but could not be covered either
+        taken_ids = {product_id for product_id, _, _ in taken}
+        shortages = []
+        for product_id, quantity in quantities.items():
+            if product_id in applied or product_id in taken_ids:
+                continue
+            product = current.get(product_id)
+            available = Product._available(product, product_id, held) if product else 0
+            if product_id in failed or available < quantity:
+                shortages.append({
+                    'productId': product_id,
+                    'name': product.get('name') if product else None,
+                    'requested': quantity,
+                    'available': max(available, 0),
+                    'found': product is not None
+                })
+        
+        return shortages
+    
+    @staticmethod
+    def _clear_reservation(product_ids, token):
+        """Remove a successful reservation's tag from its products"""
+        if not product_ids:
+            return
+        
+        db = get_db()
+        db.products.bulk_write([
+            UpdateOne({'_id': ObjectId(product_id)}, {'$pull': {'stockReservations': token}})
+            for product_id in product_ids
+        ], ordered=False)
+    
+    @staticmethod
+    def release_stock(items):
+        """Return stock for order lines (cancellation or failed checkout) in one bulk_write"""
         db = get_db()
+        quantities = Product._quantities_by_product(items)
+        now = datetime.utcnow()
+        
+        valid = {
+            product_id: quantity for product_id, quantity in quantities.items()
+            if ObjectId.is_valid(product_id)
+        }
+        if not valid:
+            return
+        
+        result = db.products.bulk_write([
+            UpdateOne(
+                {'_id': ObjectId(product_id), 'stockShards': None},
+                {'$inc': {'stock': quantity}, '$set': {'updatedAt': now}}
+            )
+            for product_id, quantity in valid.items()
+        ], ordered=False)
+        
+        if result.matched_count < len(valid):
+            for product in db.products.find(
+                {'_id': {'$in': [ObjectId(product_id) for product_id in valid]},
+                 'stockShards': {'$ne': None}},
+                {'stockShards': 1}
+            ):
+                product_id = str(product['_id'])
+                StockShards.give(product_id, valid[product_id], product['stockShards'])
+        
+        for product_id in quantities:
+            Product.invalidate_cache(product_id)
+    
+    @staticmethod
+    def search(query, page=1, limit=20, filters=None):
+        """
+        Search products by text, ranked by relevance. Category/tag/price
+        filters apply alongside the text query, and the total is computed
+        in the same round trip.
+        """
+        # Normalize so repeated popular queries share a cache entry
+        terms = ' '.join(query.lower().split())
+        match = dict(filters or {'isActive': True})
         
+        cache_key = json_util.dumps([terms, match, page, limit], sort_keys=True)
+        cached = search_cache.get(cache_key)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        db = get_db()
         skip = (page - 1) * limit
+        match['$text'] = {'$search': terms}
         
-        # Text search
-        products = list(db.products.find(
-            {'$text': {'$search': query}, 'isActive': True}
-        ).skip(skip).limit(limit))
+        pipeline = [
+            {'$match': match},
+            {'$addFields': {'score': {'$meta': 'textScore'}}},
+            {'$facet': {
+                'products': [
+                    {'$sort': {'score': -1, '_id': 1}},
+                    {'$skip': skip},
+                    {'$limit': limit}
+                ],
+                'total': [{'$count': 'count'}]
+            }}
+        ]
         
-        total = len(products)
+        results = next(db.products.aggregate(pipeline), {})
+        total = results['total'][0]['count'] if results.get('total') else 0
         
-        return {
-            'products': [Product.format_product(p) for p in products],
+        result = {
+            'products': [Product.format_product(p) for p in results.get('products', [])],
             'total': total,
             'page': page,
             'pages': (total + limit - 1) // limit
         }
+        
+        search_cache.set(cache_key, result)
+        return result
     
     @staticmethod
     def format_product(product):
@@ -174,6 +731,29 @@ class Product:
             'ingredients': product.get('ingredients', []),
             'averageRating': product.get('averageRating', 0),
             'totalReviews': product.get('totalReviews', 0),
+            'ratingHistogram': {
+                str(star): product.get('ratingHistogram', {}).get(str(star), 0)
+                for star in Product.RATING_STARS
+            },
             'isActive': product.get('isActive', True),
-            'createdAt': product['createdAt'].isoformat() if product.get('createdAt') else None
+            'createdAt': product['createdAt'].isoformat() if product.get('createdAt') else None,
+            'updatedAt': product['updatedAt'].isoformat() if product.get('updatedAt') else None
         }
+
+def register_rating_commands(app):
+    """Register the `flask ratings` CLI group"""
+    
+    @app.cli.group('ratings')
+    def ratings_cli():
+        """Maintain product rating aggregates"""
+        pass
+    
+    @ratings_cli.command('rebuild')
+    def rebuild_command():
+        """Recompute every product's rating aggregates from its reviews"""
+        updated = Product.rebuild_rating_aggregates()
+        click.echo(f"✅ Rebuilt rating aggregates for {updated} products")
+
+# Writes made by other workers reach this process through the change stream watcher
+subscribe('products', Product.invalidate_cache)
+subscribe('products', search_index.mark_dirty, fields=INDEXED_FIELDS)
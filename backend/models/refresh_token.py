@@ -0,0 +1,76 @@
+"""Rotating refresh tokens"""
+from database.db import get_db
+from flask import current_app
+from datetime import datetime
+import hashlib
+import secrets
+
+class RefreshToken:
+    """
+    Opaque refresh tokens, stored only as SHA-256 hashes in refresh_tokens.
+    Each token is single use: redeeming it issues a successor in the same
+    family. Presenting a token that was already redeemed means it leaked,
+    so the whole family is revoked.
+    """
+    
+    @staticmethod
+    def _hash(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+    
+    @staticmethod
+    def issue(user_id, family=None):
+        """Create a refresh token for a user and return the raw token"""
+        db = get_db()
+        token = secrets.token_urlsafe(48)
+        now = datetime.utcnow()
+        
+        db.refresh_tokens.insert_one({
+            'tokenHash': RefreshToken._hash(token),
+            'userId': str(user_id),
+            'family': family or secrets.token_hex(16),
+            'usedAt': None,
+            'createdAt': now,
+            'expiresAt': now + current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+        })
+        
+        return token
+    
+    @staticmethod
+    def rotate(token):
+        """
+        Redeem a refresh token. Returns (user_id, successor token), or None
+        when the token is unknown, expired or already redeemed.
+        """
+        db = get_db()
+        token_hash = RefreshToken._hash(token)
+        now = datetime.utcnow()
+        
+        # Marking it used in the same update that checks it keeps
+        # concurrent redemptions of one token from both succeeding
+        record = db.refresh_tokens.find_one_and_update(
+            {'tokenHash': token_hash, 'usedAt': None, 'expiresAt': {'$gt': now}},
+            {'$set': {'usedAt': now}}
+        )
+        
+        if not record:
+            reused = db.refresh_tokens.find_one({'tokenHash': token_hash, 'usedAt': {'$ne': None}})
+            if reused:
+                db.refresh_tokens.delete_many({'family': reused['family']})
+            return None
+        
+        return record['userId'], RefreshToken.issue(record['userId'], record['family'])
+    
+    @staticmethod
+    def revoke(token):
+        """Revoke the family a refresh token belongs to (logout)"""
+        db = get_db()
+        record = db.refresh_tokens.find_one({'tokenHash': RefreshToken._hash(token)}, {'family': 1})
+        if record:
+            db.refresh_tokens.delete_many({'family': record['family']})
+        return bool(record)
+    
+    @staticmethod
+    def revoke_for_user(user_id):
+        """Revoke every refresh token of a user"""
+        db = get_db()
+        return db.refresh_tokens.delete_many({'userId': str(user_id)}).deleted_count
@@ -1,10 +1,33 @@
 from database.db import get_db
+from database.pagination import paginate_by_cursor
+from database.counter_buffer import CounterBuffer
+from database.background import start_periodic_task
+from models.user import User
+from models.product import Product
+from pymongo import ReturnDocument
 from bson.objectid import ObjectId
+from config import Config
 from datetime import datetime
+import atexit
+
+def _refresh_summaries(review_ids):
+    """Refresh review summaries once a batch of helpful votes is written"""
+    from models.review_summary import ReviewSummary
+    
+    ReviewSummary.refresh_for_reviews(review_ids)
+
+# Per-worker buffer of "helpful" votes not yet written to MongoDB; its size
+# comes from the app's HELPFUL_VOTE_BUFFER_SIZE (see init_review_votes)
+helpful_votes = CounterBuffer(
+    'reviews', 'helpful', Config.HELPFUL_VOTE_BUFFER_SIZE, on_flush=_refresh_summaries
+)
 
 class Review:
     """Review model for managing product reviews"""
     
+    # Listing orders for product reviews: sort name -> field
+    SORT_FIELDS = {'newest': 'createdAt', 'helpful': 'helpful'}
+    
     @staticmethod
     def create(user_id, product_id, review_data):
         """Create a new review"""
@@ -22,7 +45,7 @@ class Review:
         review = {
             'userId': user_id,
             'productId': product_id,
-            'rating': review_data['rating'],
+            'rating': int(review_data['rating']),
             'title': review_data.get('title'),
             'comment': review_data.get('comment'),
             'isVerified': review_data.get('isVerified', False),
@@ -37,60 +60,79 @@ class Review:
         return Review.format_review(review)
     
     @staticmethod
-    def find_by_product(product_id, page=1, limit=10):
-        """Find reviews by product ID"""
+    def find_by_product(product_id, page=1, limit=10, cursor=None, include_total=True, sort='newest'):
+        """
+        Find reviews by product ID, newest or most helpful first
+        (keyset-paginated when `cursor` is given)
+        """
         db = get_db()
         
-        skip = (page - 1) * limit
+        if sort not in Review.SORT_FIELDS:
+            raise ValueError(f"Invalid sort '{sort}'")
+        sort_field = Review.SORT_FIELDS[sort]
         
-        reviews = list(db.reviews.find(
-            {'productId': product_id}
-        ).sort('createdAt', -1).skip(skip).limit(limit))
+        if cursor is not None:
+            reviews, meta = paginate_by_cursor(
+                db.reviews, {'productId': product_id}, limit, cursor,
+                sort_field=sort_field, include_total=include_total
+            )
+        else:
+            skip = (page - 1) * limit
+            
+            reviews = list(db.reviews.find(
+                {'productId': product_id}
+            ).sort([(sort_field, -1), ('_id', -1)]).skip(skip).limit(limit))
+            
+            total = db.reviews.count_documents({'productId': product_id})
+            meta = {
+                'total': total,
+                'page': page,
+                'pages': (total + limit - 1) // limit
+            }
         
-        total = db.reviews.count_documents({'productId': product_id})
-        
-        # Get user info for each review
+        # Resolve reviewer names for the whole page at once
+        names = User.display_names(review['userId'] for review in reviews)
         formatted_reviews = []
         for review in reviews:
-            user = db.users.find_one({'_id': ObjectId(review['userId'])})
             formatted_review = Review.format_review(review)
-            formatted_review['userName'] = user['name'] if user else 'Anonymous'
+            formatted_review['userName'] = names.get(review['userId'], 'Anonymous')
             formatted_reviews.append(formatted_review)
         
-        return {
-            'reviews': formatted_reviews,
-            'total': total,
-            'page': page,
-            'pages': (total + limit - 1) // limit
-        }
+        return {'reviews': formatted_reviews, **meta}
     
     @staticmethod
-    def find_by_user(user_id, page=1, limit=10):
-        """Find reviews by user ID"""
+    def find_by_user(user_id, page=1, limit=10, cursor=None, include_total=True):
+        """Find reviews by user ID (keyset-paginated when `cursor` is given)"""
         db = get_db()
         
-        skip = (page - 1) * limit
-        
-        reviews = list(db.reviews.find(
-            {'userId': user_id}
-        ).sort('createdAt', -1).skip(skip).limit(limit))
+        if cursor is not None:
+            reviews, meta = paginate_by_cursor(
+                db.reviews, {'userId': user_id}, limit, cursor, include_total=include_total
+            )
+        else:
+            skip = (page - 1) * limit
+            
+            reviews = list(db.reviews.find(
+                {'userId': user_id}
+            ).sort([('createdAt', -1), ('_id', -1)]).skip(skip).limit(limit))
+            
+            total = db.reviews.count_documents({'userId': user_id})
+            meta = {
+                'total': total,
+                'page': page,
+                'pages': (total + limit - 1) // limit
+            }
         
-        total = db.reviews.count_documents({'userId': user_id})
-        
-        # Get product info for each review
+        # Resolve product names for the whole page at once (catalog cache first)
+        products, _ = Product.find_many(review['productId'] for review in reviews)
+        names = {product['id']: product['name'] for product in products}
         formatted_reviews = []
         for review in reviews:
-            product = db.products.find_one({'_id': ObjectId(review['productId'])})
             formatted_review = Review.format_review(review)
-            formatted_review['productName'] = product['name'] if product else 'Unknown'
+            formatted_review['productName'] = names.get(review['productId'], 'Unknown')
             formatted_reviews.append(formatted_review)
         
-        return {
-            'reviews': formatted_reviews,
-            'total': total,
-            'page': page,
-            'pages': (total + limit - 1) // limit
-        }
+        return {'reviews': formatted_reviews, **meta}
     
     @staticmethod
     def find_by_id(review_id):
@@ -101,54 +143,85 @@ class Review:
     
     @staticmethod
     def update(review_id, user_id, update_data):
-        """Update review"""
+        """
+        Update review. Returns (previous, updated) formatted reviews, both
+        from the one atomic write, so the rating change between them is
+        exactly what this update applied.
+        """
         db = get_db()
         
-        # Verify ownership
-        review = db.reviews.find_one({'_id': ObjectId(review_id)})
-        if not review or review['userId'] != user_id:
-            raise ValueError('Unauthorized to update this review')
-        
         update_data['updatedAt'] = datetime.utcnow()
+        if 'rating' in update_data:
+            update_data['rating'] = int(update_data['rating'])
         
-        db.reviews.update_one(
-            {'_id': ObjectId(review_id)},
-            {'$set': update_data}
+        # Ownership is part of the filter: no match means not found or not the author
+        previous = db.reviews.find_one_and_update(
+            {'_id': ObjectId(review_id), 'userId': user_id},
+            {'$set': update_data},
+            return_document=ReturnDocument.BEFORE
         )
+        if not previous:
+            raise ValueError('Unauthorized to update this review')
         
-        return Review.find_by_id(review_id)
+        return Review.format_review(previous), Review.format_review({**previous, **update_data})
     
     @staticmethod
     def delete(review_id, user_id):
-        """Delete review"""
+        """
+        Delete review and return it as it was deleted. Only the request that
+        actually removed the document gets it back; a repeated delete raises.
+        """
         db = get_db()
         
-        # Verify ownership
-        review = db.reviews.find_one({'_id': ObjectId(review_id)})
-        if not review or review['userId'] != user_id:
+        # Ownership is part of the filter: no match means already deleted or not the author
+        review = db.reviews.find_one_and_delete({'_id': ObjectId(review_id), 'userId': user_id})
+        if not review:
             raise ValueError('Unauthorized to delete this review')
         
-        db.reviews.delete_one({'_id': ObjectId(review_id)})
-        return True
+        return Review.format_review(review)
     
     @staticmethod
     def mark_helpful(review_id):
-        """Mark review as helpful"""
+        """
+        Mark review as helpful. The vote is buffered and written with the
+        next batch; the returned count already includes it.
+        """
         db = get_db()
         
-        db.reviews.update_one(
-            {'_id': ObjectId(review_id)},
-            {'$inc': {'helpful': 1}}
-        )
+        if not Review.votes_buffered():
+            review = db.reviews.find_one_and_update(
+                {'_id': ObjectId(review_id)},
+                {'$inc': {'helpful': 1}},
+                return_document=ReturnDocument.AFTER
+            )
+            return Review.format_review(review) if review else None
+        
+        review = db.reviews.find_one({'_id': ObjectId(review_id)})
+        if not review:
+            return None
         
-        return Review.find_by_id(review_id)
+        helpful_votes.add(review_id)
+        return Review.format_review(review)
     
     @staticmethod
-    def format_review(review):
-        """Format review object for response"""
+    def votes_buffered():
+        """Whether helpful votes go through the write-behind buffer"""
+        return helpful_votes.max_pending > 0
+    
+    @staticmethod
+    def format_review(review, include_pending=True):
+        """
+        Format review object for response. Helpful votes still buffered in
+        this worker are included unless include_pending is False (for
+        documents shared with other workers).
+        """
         if not review:
             return None
         
+        helpful = review.get('helpful', 0)
+        if include_pending:
+            helpful += helpful_votes.pending(review['_id'])
+        
         return {
             'id': str(review['_id']),
             'userId': review['userId'],
@@ -157,7 +230,28 @@ class Review:
             'title': review.get('title'),
             'comment': review.get('comment'),
             'isVerified': review.get('isVerified', False),
-            'helpful': review.get('helpful', 0),
+            'helpful': helpful,
             'createdAt': review['createdAt'].isoformat() if review.get('createdAt') else None,
             'updatedAt': review['updatedAt'].isoformat() if review.get('updatedAt') else None
         }
+
+def init_review_votes(app):
+    """Flush buffered helpful votes periodically in each worker and at exit"""
+    helpful_votes.max_pending = app.config.get('HELPFUL_VOTE_BUFFER_SIZE', 0)
+    if not Review.votes_buffered():
+        return None
+    
+    def flush_on_exit():
+        with app.app_context():
+            try:
+                helpful_votes.flush()
+            except Exception as e:
+                print(f"⚠️  Could not flush helpful votes: {str(e)}")
+    
+    atexit.register(flush_on_exit)
+    
+    # Summaries are refreshed by the buffer's on_flush callback
+    return start_periodic_task(
+        app, 'helpful-vote-flusher', app.config.get('HELPFUL_VOTE_FLUSH_INTERVAL', 5),
+        helpful_votes.flush
+    )
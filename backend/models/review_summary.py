@@ -0,0 +1,145 @@
+from database.db import get_db
+from database.cache import LRUCache
+from database.change_streams import subscribe
+from models.review import Review
+from models.user import User
+from config import Config
+from bson.objectid import ObjectId
+from datetime import datetime
+
+# Per-worker cache of formatted summaries, keyed by product id
+summary_cache = LRUCache('review_summaries', Config.CATALOG_CACHE_MAX_SIZE, Config.CATALOG_CACHE_TTL)
+
+class ReviewSummary:
+    """
+    Materialized per-product review summary (rating aggregates, star
+    distribution and the most helpful reviews) stored in review_summaries
+    and refreshed whenever one of the product's reviews changes.
+    """
+    
+    @staticmethod
+    def invalidate_cache(product_id=None):
+        """Drop a cached summary (all of them when no id)"""
+        if product_id is None:
+            summary_cache.clear()
+        else:
+            summary_cache.delete(str(product_id))
+    
+    @staticmethod
+    def get(product_id):
+        """Summary for a product, building it on first request; None if no such product"""
+        product_id = str(product_id)
+        cached = summary_cache.get(product_id)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        db = get_db()
+        summary = db.review_summaries.find_one({'_id': product_id})
+        if summary is None:
+            return ReviewSummary.refresh(product_id)
+        
+        formatted = ReviewSummary.format_summary(summary)
+        summary_cache.set(product_id, formatted)
+        return formatted
+    
+    @staticmethod
+    def refresh(product_id, product=None):
+        """
+        Rebuild one product's summary. `product` may be the formatted product
+        just returned by a rating update, saving a read.
+        """
+        db = get_db()
+        product_id = str(product_id)
+        
+        if product is None:
+            if not ObjectId.is_valid(product_id):
+                return None
+            product = db.products.find_one(
+                {'_id': ObjectId(product_id)},
+                {'averageRating': 1, 'totalReviews': 1, 'ratingHistogram': 1}
+            )
+        if product is None:
+            db.review_summaries.delete_one({'_id': product_id})
+            ReviewSummary.invalidate_cache(product_id)
+            return None
+        
+        # Served by the (productId, helpful, _id) index
+        top = list(db.reviews.find({'productId': product_id}).sort(
+            [('helpful', -1), ('_id', -1)]
+        ).limit(Config.REVIEW_SUMMARY_TOP_REVIEWS))
+        names = User.display_names(review['userId'] for review in top)
+        
+        top_reviews = []
+        for review in top:
+            # Persisted for every worker, so only votes already written count
+            formatted_review = Review.format_review(review, include_pending=False)
+            formatted_review['userName'] = names.get(review['userId'], 'Anonymous')
+            top_reviews.append(formatted_review)
+        
+        # MongoDB keeps milliseconds; truncating here makes the cached copy,
+        # the stored one and the ETag derived from them agree
+        now = datetime.utcnow()
+        updated_at = now.replace(microsecond=now.microsecond // 1000 * 1000)
+        
+        histogram = product.get('ratingHistogram') or {}
+        summary = {
+            '_id': product_id,
+            'averageRating': product.get('averageRating', 0),
+            'totalReviews': product.get('totalReviews', 0),
+            'ratingHistogram': {str(star): histogram.get(str(star), 0) for star in range(1, 6)},
+            'topReviews': top_reviews,
+            'updatedAt': updated_at
+        }
+        db.review_summaries.replace_one({'_id': product_id}, summary, upsert=True)
+        
+        formatted = ReviewSummary.format_summary(summary)
+        summary_cache.set(product_id, formatted)
+        return formatted
+    
+    @staticmethod
+    def refresh_for_reviews(review_ids):
+        """
+        Refresh the summaries of products whose reviews received helpful
+        votes, skipping products where none of them can reach the top list.
+        """
+        object_ids = [ObjectId(review_id) for review_id in review_ids if ObjectId.is_valid(review_id)]
+        if not object_ids:
+            return
+        
+        db = get_db()
+        voted = {}
+        for review in db.reviews.find({'_id': {'$in': object_ids}}, {'productId': 1, 'helpful': 1}):
+            voted.setdefault(review['productId'], []).append(review)
+        
+        summaries = {
+            summary['_id']: summary
+            for summary in db.review_summaries.find(
+                {'_id': {'$in': list(voted)}}, {'topReviews.id': 1, 'topReviews.helpful': 1}
+            )
+        }
+        
+        for product_id, reviews in voted.items():
+            summary = summaries.get(product_id)
+            if summary is None:
+                continue
+            top = summary.get('topReviews', [])
+            top_ids = {review['id'] for review in top}
+            lowest = min((review['helpful'] for review in top), default=0)
+            if (len(top) < Config.REVIEW_SUMMARY_TOP_REVIEWS
+                    or any(str(r['_id']) in top_ids or r.get('helpful', 0) >= lowest for r in reviews)):
+                ReviewSummary.refresh(product_id)
+    
+    @staticmethod
+    def format_summary(summary):
+        """Format summary document for response"""
+        return {
+            'productId': summary['_id'],
+            'averageRating': summary.get('averageRating', 0),
+            'totalReviews': summary.get('totalReviews', 0),
+            'ratingHistogram': summary.get('ratingHistogram', {}),
+            'topReviews': summary.get('topReviews', []),
+            'updatedAt': summary['updatedAt'].isoformat() if summary.get('updatedAt') else None
+        }
+
+# Refreshes made by other workers reach this process through the change stream watcher
+subscribe('review_summaries', ReviewSummary.invalidate_cache)
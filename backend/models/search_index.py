@@ -0,0 +1,225 @@
+from database.db import get_db
+from bson.objectid import ObjectId
+import bisect
+import re
+import threading
+
+# Relative weight of a match in each product field
+FIELD_WEIGHTS = {
+    'name': 3.0,
+    'tags': 2.0,
+    'ingredients': 1.5,
+    'description': 1.0
+}
+
+# Prefix matches score slightly below whole-word matches, fuzzy ones lower still
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.5
+MIN_TRIGRAM_SIMILARITY = 0.3
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Product fields the index reads; writes touching only other fields
+# (stock, holds, ratings) leave it untouched
+INDEXED_FIELDS = (
+    'name', 'slug', 'price', 'category', 'images',
+    'description', 'tags', 'ingredients', 'isActive'
+)
+
+def tokenize(text):
+    """Lowercase alphanumeric tokens of a string"""
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+def trigrams(term):
+    """Character trigrams of a term, padded so short terms still have some"""
+    padded = f"  {term} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class ProductSearchIndex:
+    """
+    Per-worker inverted index over active products for as-you-type
+    suggestions. Built lazily on first use; product writes mark documents
+    dirty and they are re-read (in one query) before the next lookup.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._built = False
+        self._dirty = set()
+        self._docs = {}
+        self._doc_terms = {}
+        self._postings = {}
+        self._trigrams = {}
+        self._sorted_terms = []
+    
+    def mark_dirty(self, product_id=None):
+        """Schedule a product (or the whole index when None) for re-indexing"""
+        with self._lock:
+            if product_id is None:
+                self._built = False
+                self._dirty.clear()
+            else:
+                self._dirty.add(str(product_id))
+    
+    def _projection(self):
+        return {field: 1 for field in INDEXED_FIELDS}
+    
+    def _ensure_fresh(self):
+        """Build the index or apply pending updates before a lookup"""
+        if self._built and not self._dirty:
+            return
+        
+        db = get_db()
+        with self._lock:
+            # Pending ids are only cleared once the reload succeeded, so a
+            # failed read leaves them queued for the next lookup
+            ids = list(self._dirty)
+            if not self._built:
+                products = list(db.products.find({'isActive': True}, self._projection()))
+                self._reset()
+                for product in products:
+                    self._add(product)
+                self._built = True
+            elif ids:
+                object_ids = [ObjectId(i) for i in ids if ObjectId.is_valid(i)]
+                products = list(db.products.find({'_id': {'$in': object_ids}}, self._projection()))
+                for product_id in ids:
+                    self._remove(product_id)
+                for product in products:
+                    if product.get('isActive', True):
+                        self._add(product)
+            self._dirty.difference_update(ids)
+            self._sorted_terms = sorted(self._postings)
+    
+    def _reset(self):
+        self._docs = {}
+        self._doc_terms = {}
+        self._postings = {}
+        self._trigrams = {}
+        self._sorted_terms = []
+    
+    def _add(self, product):
+        product_id = str(product['_id'])
+        images = product.get('images') or []
+        
+        self._docs[product_id] = {
+            'id': product_id,
+            'name': product.get('name'),
+            'slug': product.get('slug'),
+            'price': product.get('price'),
+            'category': product.get('category'),
+            'image': images[0].get('url') if images else None
+        }
+        
+        terms = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            value = product.get(field)
+            text = ' '.join(value) if isinstance(value, list) else value
+            for term in tokenize(text):
+                terms[term] = max(terms.get(term, 0), weight)
+        
+        for term, weight in terms.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                for gram in trigrams(term):
+                    self._trigrams.setdefault(gram, set()).add(term)
+            postings[product_id] = weight
+        
+        self._doc_terms[product_id] = set(terms)
+    
+    def _remove(self, product_id):
+        self._docs.pop(product_id, None)
+        for term in self._doc_terms.pop(product_id, set()):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(product_id, None)
+            if not postings:
+                del self._postings[term]
+                for gram in trigrams(term):
+                    terms = self._trigrams.get(gram)
+                    if terms is not None:
+                        terms.discard(term)
+                        if not terms:
+                            del self._trigrams[gram]
+    
+    def _prefix_terms(self, prefix):
+        start = bisect.bisect_left(self._sorted_terms, prefix)
+        matches = []
+        for term in self._sorted_terms[start:]:
+            if not term.startswith(prefix):
+                break
+            matches.append(term)
+        return matches
+    
+    def _fuzzy_terms(self, token):
+        grams = trigrams(token)
+        overlap = {}
+        for gram in grams:
+            for term in self._trigrams.get(gram, ()):
+                overlap[term] = overlap.get(term, 0) + 1
+        
+        matches = []
+        for term, shared in overlap.items():
+            similarity = shared / len(grams | trigrams(term))
+            if similarity >= MIN_TRIGRAM_SIMILARITY:
+                matches.append((term, similarity))
+        return matches
+    
+    def _match_token(self, token, is_last):
+        """doc_id -> score for one query token"""
+        scores = {}
+        
+        def add(term, factor):
+            for product_id, weight in self._postings.get(term, {}).items():
+                scores[product_id] = max(scores.get(product_id, 0), weight * factor)
+        
+        if token in self._postings:
+            add(token, 1.0)
+        
+        # The token being typed is usually incomplete
+        if is_last:
+            for term in self._prefix_terms(token):
+                if term != token:
+                    add(term, PREFIX_FACTOR)
+        
+        if not scores and len(token) >= 3:
+            for term, similarity in self._fuzzy_terms(token):
+                add(term, FUZZY_FACTOR * similarity)
+        
+        return scores
+    
+    def suggest(self, query, limit=8):
+        """Rank products whose fields match every token of `query`"""
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        
+        self._ensure_fresh()
+        
+        with self._lock:
+            combined = None
+            for i, token in enumerate(tokens):
+                scores = self._match_token(token, is_last=(i == len(tokens) - 1))
+                if combined is None:
+                    combined = scores
+                else:
+                    combined = {
+                        product_id: combined[product_id] + score
+                        for product_id, score in scores.items()
+                        if product_id in combined
+                    }
+                if not combined:
+                    return []
+            
+            ranked = sorted(
+                combined.items(),
+                key=lambda item: (-item[1], self._docs[item[0]]['name'] or '')
+            )
+            return [
+                dict(self._docs[product_id], score=round(score, 3))
+                for product_id, score in ranked[:limit]
+            ]
+
+search_index = ProductSearchIndex()
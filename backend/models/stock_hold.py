@@ -0,0 +1,220 @@
+"""Time-limited cart inventory holds"""
+from database.db import get_db
+from database.background import start_periodic_task
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+from bson.objectid import ObjectId
+from datetime import datetime, timedelta
+import click
+
+# A claim older than this belongs to a sweep that died before deleting its holds
+STALE_CLAIM_SECONDS = 300
+
+class StockHold:
+    """
+    A hold reserves `quantity` of a product for a user's cart until
+    `expiresAt`. Products carry a `heldStock` counter maintained with $inc
+    as holds are placed and released, so available stock is always
+    `stock - heldStock` without scanning the holds collection.
+    """
+    
+    @staticmethod
+    def available_expr(required):
+        """$expr matching products whose unheld stock covers `required`"""
+        return {'$gte': [
+            {'$subtract': ['$stock', {'$ifNull': ['$heldStock', 0]}]},
+            required
+        ]}
+    
+    @staticmethod
+    def place(user_id, product_id, quantity, ttl_seconds):
+        """
+        Hold stock for a cart line. Returns the hold document, or None when
+        not enough unheld stock is left.
+        """
+        if not ObjectId.is_valid(str(product_id)):
+            return None
+        
+        db = get_db()
+        now = datetime.utcnow()
+        
+        # Sharded products are never held: products.stock is only their
+        # consolidated display total (see StockShards)
+        result = db.products.update_one(
+            {'_id': ObjectId(product_id), 'stockShards': None,
+             '$expr': StockHold.available_expr(quantity)},
+            {'$inc': {'heldStock': quantity}}
+        )
+        if result.modified_count == 0:
+            return None
+        
+        hold = {
+            'userId': str(user_id),
+            'productId': str(product_id),
+            'quantity': quantity,
+            'createdAt': now,
+            'expiresAt': now + timedelta(seconds=ttl_seconds)
+        }
+        try:
+            hold['_id'] = db.stock_holds.insert_one(hold).inserted_id
+        except PyMongoError:
+            db.products.update_one(
+                {'_id': ObjectId(product_id)},
+                {'$inc': {'heldStock': -quantity}}
+            )
+            raise
+        
+        return hold
+    
+    @staticmethod
+    def held_by_user(user_id):
+        """productId -> quantity currently held for a user"""
+        db = get_db()
+        held = {}
+        for hold in db.stock_holds.find(
+            {'userId': str(user_id), 'expiresAt': {'$gt': datetime.utcnow()}},
+            {'productId': 1, 'quantity': 1}
+        ):
+            held[hold['productId']] = held.get(hold['productId'], 0) + hold['quantity']
+        return held
+    
+    @staticmethod
+    def release(filters, batch_size=500):
+        """
+        Release up to `batch_size` holds matching `filters` and return how many
+        were released. Holds are first claimed with a token so that concurrent
+        sweepers in other workers never release the same hold twice; claimed
+        holds are deleted before the counters are decremented, so a crash can
+        only leave stock over-held (see `flask holds reconcile`), never oversold.
+        """
+        db = get_db()
+        now = datetime.utcnow()
+        
+        unclaimed = {'$or': [
+            {'claimedBy': None},
+            {'claimedAt': {'$lt': now - timedelta(seconds=STALE_CLAIM_SECONDS)}}
+        ]}
+        query = {'$and': [filters, unclaimed]} if filters else unclaimed
+        
+        ids = [hold['_id'] for hold in db.stock_holds.find(query, {'_id': 1}).limit(batch_size)]
+        if not ids:
+            return 0
+        
+        token = ObjectId()
+        db.stock_holds.update_many(
+            {'$and': [{'_id': {'$in': ids}}, unclaimed]},
+            {'$set': {'claimedBy': token, 'claimedAt': now}}
+        )
+        
+        claimed = list(db.stock_holds.find({'claimedBy': token}, {'productId': 1, 'quantity': 1}))
+        if not claimed:
+            return 0
+        
+        db.stock_holds.delete_many({'claimedBy': token})
+        
+        quantities = {}
+        for hold in claimed:
+            quantities[hold['productId']] = quantities.get(hold['productId'], 0) + hold['quantity']
+        
+        db.products.bulk_write([
+            UpdateOne({'_id': ObjectId(product_id)}, {'$inc': {'heldStock': -quantity}})
+            for product_id, quantity in quantities.items()
+            if ObjectId.is_valid(product_id)
+        ], ordered=False)
+        
+        return len(claimed)
+    
+    @staticmethod
+    def release_all(filters, batch_size=500):
+        """Release every hold matching `filters`, one batch at a time"""
+        total = 0
+        while True:
+            released = StockHold.release(filters, batch_size)
+            total += released
+            if released < batch_size:
+                return total
+    
+    @staticmethod
+    def release_for_user(user_id, product_id=None):
+        """Release a user's holds (for one product when given)"""
+        filters = {'userId': str(user_id)}
+        if product_id is not None:
+            filters['productId'] = str(product_id)
+        return StockHold.release_all(filters)
+    
+    @staticmethod
+    def release_expired_for_user(user_id, product_id=None):
+        """
+        Release a user's expired holds now instead of waiting for the
+        sweeper, so they stop counting against the user's own checkout
+        """
+        filters = {'userId': str(user_id), 'expiresAt': {'$lte': datetime.utcnow()}}
+        if product_id is not None:
+            filters['productId'] = str(product_id)
+        return StockHold.release_all(filters)
+    
+    @staticmethod
+    def sweep_expired(batch_size=500):
+        """Release holds whose expiry has passed"""
+        return StockHold.release_all({'expiresAt': {'$lte': datetime.utcnow()}}, batch_size)
+    
+    @staticmethod
+    def reconcile():
+        """
+        Recompute every product's heldStock from the live holds. Returns the
+        number of products whose counter was corrected.
+        """
+        db = get_db()
+        
+        held = {
+            row['_id']: row['quantity']
+            for row in db.stock_holds.aggregate([
+                {'$group': {'_id': '$productId', 'quantity': {'$sum': '$quantity'}}}
+            ])
+        }
+        
+        operations = []
+        for product in db.products.find(
+            {'$or': [{'heldStock': {'$ne': 0, '$exists': True}}, {'_id': {'$in': [
+                ObjectId(product_id) for product_id in held if ObjectId.is_valid(product_id)
+            ]}}]},
+            {'heldStock': 1}
+        ):
+            expected = held.get(str(product['_id']), 0)
+            if product.get('heldStock', 0) != expected:
+                operations.append(UpdateOne(
+                    {'_id': product['_id']}, {'$set': {'heldStock': expected}}
+                ))
+        
+        if operations:
+            db.products.bulk_write(operations, ordered=False)
+        return len(operations)
+
+def init_stock_holds(app):
+    """Register the hold sweeper and the `flask holds` CLI group"""
+    
+    @app.cli.group('holds')
+    def holds_cli():
+        """Manage cart inventory holds"""
+        pass
+    
+    @holds_cli.command('sweep')
+    def sweep_command():
+        """Release expired holds now"""
+        released = StockHold.sweep_expired(app.config.get('CART_HOLD_SWEEP_BATCH_SIZE', 500))
+        click.echo(f"✅ Released {released} expired holds")
+    
+    @holds_cli.command('reconcile')
+    def reconcile_command():
+        """Recompute product heldStock counters from the holds collection"""
+        corrected = StockHold.reconcile()
+        click.echo(f"✅ Corrected heldStock on {corrected} products")
+    
+    if not app.config.get('CART_HOLDS_ENABLED', False):
+        return None
+    
+    batch_size = app.config.get('CART_HOLD_SWEEP_BATCH_SIZE', 500)
+    return start_periodic_task(
+        app, 'stock-hold-sweeper', app.config.get('CART_HOLD_SWEEP_INTERVAL', 30),
+        lambda: StockHold.sweep_expired(batch_size)
+    )
@@ -0,0 +1,255 @@
+"""Sharded stock counters for high-contention products"""
+from database.db import get_db
+from database.background import start_periodic_task
+from models.stock_hold import StockHold
+from pymongo import UpdateOne
+from bson.objectid import ObjectId
+from datetime import datetime
+import click
+import random
+
+MAX_SHARDS = 64
+
+def _invalidate_products(product_ids):
+    """
+    Drop cached products and listings after a write to products.stock.
+    Every such write also sets updatedAt, which the catalog ETags derive from.
+    """
+    from models.product import Product
+    
+    for product_id in product_ids:
+        Product.invalidate_cache(product_id)
+
+class StockShards:
+    """
+    Stock for a hot product can be split across `stockShards` counter
+    documents in the stock_shards collection so that concurrent orders
+    update different documents instead of serializing on the product.
+    While a product is sharded the shards are authoritative and
+    `products.stock` is a periodically consolidated total for display.
+    """
+    
+    @staticmethod
+    def _split(total, shards):
+        """Spread `total` units as evenly as possible over `shards` counters"""
+        base, extra = divmod(max(total, 0), shards)
+        return [base + (1 if i < extra else 0) for i in range(shards)]
+    
+    @staticmethod
+    def enable(product_id, shards):
+        """
+        Move a product's stock into `shards` counters. Setting stockShards
+        and reading the stock happen in one atomic update, so no order can
+        decrement products.stock once its value has been copied. Cart holds
+        on the product are released, since sharded stock is not held.
+        Returns False when the product does not exist.
+        """
+        if not 2 <= shards <= MAX_SHARDS:
+            raise ValueError(f'Shard count must be between 2 and {MAX_SHARDS}')
+        
+        db = get_db()
+        if StockShards.shard_count(product_id):
+            StockShards.disable(product_id)
+        
+        product = db.products.find_one_and_update(
+            {'_id': ObjectId(product_id), 'stockShards': None},
+            {'$set': {'stockShards': shards, 'updatedAt': datetime.utcnow()}},
+            projection={'stock': 1}
+        )
+        if not product:
+            return False
+        
+        StockShards.set_total(product_id, product.get('stock', 0), shards)
+        StockHold.release_all({'productId': str(product_id)})
+        _invalidate_products([product_id])
+        return True
+    
+    @staticmethod
+    def disable(product_id):
+        """
+        Fold the shards back into products.stock. The product switches back
+        to the single-document path first (with its display total zeroed),
+        then each shard is deleted and its remaining units added back.
+        """
+        db = get_db()
+        
+        product = db.products.find_one_and_update(
+            {'_id': ObjectId(product_id), 'stockShards': {'$ne': None}},
+            {'$unset': {'stockShards': ''}, '$set': {'stock': 0, 'updatedAt': datetime.utcnow()}}
+        )
+        if not product:
+            return False
+        
+        while True:
+            shard = db.stock_shards.find_one_and_delete({'productId': str(product_id)})
+            if shard is None:
+                break
+            db.products.update_one(
+                {'_id': ObjectId(product_id)},
+                {'$inc': {'stock': shard.get('stock', 0)}, '$set': {'updatedAt': datetime.utcnow()}}
+            )
+        
+        _invalidate_products([product_id])
+        return True
+    
+    @staticmethod
+    def shard_count(product_id):
+        """Number of shards for a product, or 0 when it is not sharded"""
+        db = get_db()
+        product = db.products.find_one({'_id': ObjectId(product_id)}, {'stockShards': 1})
+        return (product or {}).get('stockShards') or 0
+    
+    @staticmethod
+    def take(product_id, quantity, shards):
+        """
+        Decrement `quantity` units. A random shard is tried first with a
+        conditional update, then the others in turn; if no single shard can
+        cover the quantity it is gathered from several and given back if the
+        shards together fall short. Returns True on success.
+        """
+        db = get_db()
+        product_id = str(product_id)
+        
+        start = random.randrange(shards)
+        for offset in range(shards):
+            result = db.stock_shards.update_one(
+                {'productId': product_id, 'shard': (start + offset) % shards,
+                 'stock': {'$gte': quantity}},
+                {'$inc': {'stock': -quantity}}
+            )
+            if result.modified_count:
+                return True
+        
+        taken = []
+        remaining = quantity
+        for shard in db.stock_shards.find(
+            {'productId': product_id, 'stock': {'$gt': 0}}
+        ).sort('stock', -1):
+            portion = min(remaining, shard['stock'])
+            result = db.stock_shards.update_one(
+                {'_id': shard['_id'], 'stock': {'$gte': portion}},
+                {'$inc': {'stock': -portion}}
+            )
+            if result.modified_count:
+                taken.append((shard['_id'], portion))
+                remaining -= portion
+                if remaining == 0:
+                    return True
+        
+        if taken:
+            db.stock_shards.bulk_write([
+                UpdateOne({'_id': shard_id}, {'$inc': {'stock': portion}})
+                for shard_id, portion in taken
+            ], ordered=False)
+        return False
+    
+    @staticmethod
+    def give(product_id, quantity, shards):
+        """
+        Add `quantity` units to a random shard, or to products.stock when the
+        shards are gone because the product was switched back meanwhile
+        """
+        db = get_db()
+        result = db.stock_shards.update_one(
+            {'productId': str(product_id), 'shard': random.randrange(shards)},
+            {'$inc': {'stock': quantity}}
+        )
+        if result.matched_count == 0:
+            db.products.update_one(
+                {'_id': ObjectId(product_id)},
+                {'$inc': {'stock': quantity}, '$set': {'updatedAt': datetime.utcnow()}}
+            )
+            _invalidate_products([product_id])
+    
+    @staticmethod
+    def set_total(product_id, total, shards):
+        """Overwrite a sharded product's stock with `total` units"""
+        db = get_db()
+        db.stock_shards.bulk_write([
+            UpdateOne(
+                {'productId': str(product_id), 'shard': shard},
+                {'$set': {'stock': stock}},
+                upsert=True
+            )
+            for shard, stock in enumerate(StockShards._split(total, shards))
+        ], ordered=False)
+    
+    @staticmethod
+    def totals(product_ids):
+        """productId -> units left across all shards"""
+        db = get_db()
+        return {
+            row['_id']: row['stock']
+            for row in db.stock_shards.aggregate([
+                {'$match': {'productId': {'$in': [str(i) for i in product_ids]}}},
+                {'$group': {'_id': '$productId', 'stock': {'$sum': '$stock'}}}
+            ])
+        }
+    
+    @staticmethod
+    def consolidate():
+        """
+        Write each sharded product's shard total back to products.stock.
+        Returns the ids of products whose stock changed.
+        """
+        db = get_db()
+        
+        current = {
+            str(product['_id']): product.get('stock', 0)
+            for product in db.products.find({'stockShards': {'$ne': None}}, {'stock': 1})
+        }
+        if not current:
+            return []
+        
+        totals = StockShards.totals(current)
+        changed = [
+            product_id for product_id, stock in current.items()
+            if totals.get(product_id, 0) != stock
+        ]
+        if changed:
+            now = datetime.utcnow()
+            db.products.bulk_write([
+                UpdateOne(
+                    {'_id': ObjectId(product_id), 'stockShards': {'$ne': None}},
+                    {'$set': {'stock': totals.get(product_id, 0), 'updatedAt': now}}
+                )
+                for product_id in changed
+            ], ordered=False)
+            _invalidate_products(changed)
+        return changed
+
+def consolidate_stock_shards():
+    """Consolidate shard totals (changed products are invalidated by consolidate)"""
+    StockShards.consolidate()
+
+def init_stock_shards(app):
+    """Register the consolidation job and the `flask shards` CLI group"""
+    
+    @app.cli.group('shards')
+    def shards_cli():
+        """Manage sharded stock counters"""
+        pass
+    
+    @shards_cli.command('set')
+    @click.argument('product_id')
+    @click.argument('shards', type=int)
+    def set_command(product_id, shards):
+        """Split a product's stock across SHARDS counters (1 to disable)"""
+        from models.product import Product
+        
+        if Product.set_stock_shards(product_id, shards):
+            click.echo(f"✅ Stock for {product_id} uses {max(shards, 1)} counter(s)")
+        else:
+            click.echo(f"Product {product_id} not found")
+    
+    @shards_cli.command('consolidate')
+    def consolidate_command():
+        """Write shard totals back to products.stock now"""
+        consolidate_stock_shards()
+        click.echo("✅ Shard totals consolidated")
+    
+    return start_periodic_task(
+        app, 'stock-shard-consolidator',
+        app.config.get('STOCK_SHARD_CONSOLIDATE_INTERVAL', 10),
+        consolidate_stock_shards
+    )
@@ -1,13 +1,35 @@
 from database.db import get_db
+from database.cache import LRUCache
+from database.change_streams import subscribe
+from config import Config
+from pymongo import ReturnDocument
 from bson.objectid import ObjectId
-from werkzeug.security import generate_password_hash, check_password_hash
+from models.password_hasher import hasher, HasherBusy
 from datetime import datetime
 import jwt
 from flask import current_app
 
+# Display names shown next to reviews, keyed by user id
+name_cache = LRUCache('user_names', Config.USER_NAME_CACHE_MAX_SIZE, Config.USER_NAME_CACHE_TTL)
+
+# Lean user documents resolved by the auth decorators, keyed by user id
+principal_cache = LRUCache('principals', Config.PRINCIPAL_CACHE_MAX_SIZE, Config.PRINCIPAL_CACHE_TTL)
+
+# Current tokenVersion per user id, checked against the token's claim
+version_cache = LRUCache('token_versions', Config.PRINCIPAL_CACHE_MAX_SIZE, Config.TOKEN_VERSION_CACHE_TTL)
+
 class User:
     """User model for authentication and user management"""
     
+    # Fields returned by update methods (callers never need the password hash)
+    PROFILE_PROJECTION = {'password': 0}
+    WISHLIST_PROJECTION = {'wishlist': 1}
+    # Fields the auth decorators hand to every handler; anything else
+    # (password hash, addresses, wishlist) is loaded by the handlers that need it
+    PRINCIPAL_PROJECTION = {'email': 1, 'name': 1, 'role': 1}
+    # Changing any of these bumps tokenVersion, revoking issued tokens
+    TOKEN_REVOKING_FIELDS = ('role', 'password')
+    
     @staticmethod
     def create(email, password, name, phone=None):
         """Create a new user"""
@@ -19,13 +41,14 @@ class User:
         
         user_data = {
             'email': email,
-            'password': generate_password_hash(password),
+            'password': User.hash_password(password),
             'name': name,
             'phone': phone,
             'role': 'customer',
             'isVerified': False,
             'addresses': [],
             'wishlist': [],
+            'tokenVersion': 0,
             'createdAt': datetime.utcnow(),
             'updatedAt': datetime.utcnow()
         }
@@ -48,23 +71,139 @@ class User:
         user = db.users.find_one({'_id': ObjectId(user_id)})
         return user
     
+    @staticmethod
+    def find_principal(user_id):
+        """
+        Lean user document for an authenticated request, served from the
+        per-worker principal cache. Returns None if the user does not exist.
+        """
+        user_id = str(user_id)
+        cached = principal_cache.get(user_id)
+        if cached is not LRUCache.MISSING:
+            return dict(cached)
+        
+        db = get_db()
+        user = db.users.find_one({'_id': ObjectId(user_id)}, User.PRINCIPAL_PROJECTION)
+        if user:
+            principal_cache.set(user_id, user)
+            return dict(user)
+        return None
+    
+    @staticmethod
+    def token_version(user_id, fresh=False):
+        """
+        Current tokenVersion of a user (cached per worker; `fresh` reads it
+        from the database). None if the user does not exist.
+        """
+        user_id = str(user_id)
+        cached = LRUCache.MISSING if fresh else version_cache.get(user_id)
+        if cached is not LRUCache.MISSING:
+            return cached
+        
+        db = get_db()
+        user = db.users.find_one({'_id': ObjectId(user_id)}, {'tokenVersion': 1})
+        if not user:
+            return None
+        version = user.get('tokenVersion', 0)
+        version_cache.set(user_id, version)
+        return version
+    
+    @staticmethod
+    def get_wishlist(user_id):
+        """Product ids in a user's wishlist"""
+        db = get_db()
+        user = db.users.find_one({'_id': ObjectId(user_id)}, User.WISHLIST_PROJECTION)
+        return (user or {}).get('wishlist', [])
+    
+    @staticmethod
+    def display_names(user_ids):
+        """
+        Map user ids to display names with at most one $in query, serving
+        known names from the per-worker name cache. Unknown users are absent.
+        """
+        ids = list(dict.fromkeys(str(user_id) for user_id in user_ids))
+        
+        names = {}
+        to_fetch = []
+        for user_id in ids:
+            cached = name_cache.get(user_id)
+            if cached is not LRUCache.MISSING:
+                names[user_id] = cached
+            elif ObjectId.is_valid(user_id):
+                to_fetch.append(ObjectId(user_id))
+        
+        if to_fetch:
+            db = get_db()
+            for user in db.users.find({'_id': {'$in': to_fetch}}, {'name': 1}):
+                names[str(user['_id'])] = user.get('name')
+                name_cache.set(str(user['_id']), user.get('name'))
+        
+        return names
+    
+    @staticmethod
+    def invalidate_cache(user_id=None):
+        """Drop a user's cached display name, principal and token version (all of them when no id)"""
+        if user_id is None:
+            name_cache.clear()
+            principal_cache.clear()
+            version_cache.clear()
+        else:
+            name_cache.delete(str(user_id))
+            principal_cache.delete(str(user_id))
+            version_cache.delete(str(user_id))
+    
+    @staticmethod
+    def hash_password(password):
+        """Hash a password off the request thread (raises HasherBusy when saturated)"""
+        return hasher.hash(password)
+    
     @staticmethod
     def verify_password(stored_password, provided_password):
-        """Verify password"""
-        return check_password_hash(stored_password, provided_password)
+        """Verify password (raises HasherBusy when saturated)"""
+        return hasher.verify(stored_password, provided_password)
+    
+    @staticmethod
+    def rehash_password_if_needed(user, password):
+        """
+        Re-hash a just-verified password when PASSWORD_HASH_METHOD changed
+        since it was stored. Issued tokens stay valid. Best effort: a busy
+        pool leaves the old hash for the next login.
+        """
+        if not hasher.needs_rehash(user['password']):
+            return False
+        
+        try:
+            new_hash = hasher.hash(password)
+        except HasherBusy:
+            return False
+        
+        db = get_db()
+        result = db.users.update_one(
+            {'_id': user['_id'], 'password': user['password']},
+            {'$set': {'password': new_hash}}
+        )
+        return result.modified_count == 1
     
     @staticmethod
     def update(user_id, update_data):
-        """Update user data"""
+        """Update user data; role or password changes revoke issued tokens"""
         db = get_db()
         update_data['updatedAt'] = datetime.utcnow()
         
-        db.users.update_one(
+        update = {'$set': update_data}
+        if any(field in update_data for field in User.TOKEN_REVOKING_FIELDS):
+            update['$inc'] = {'tokenVersion': 1}
+        
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$set': update_data}
+            update,
+            projection=User.PROFILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        return user
     
     @staticmethod
     def add_address(user_id, address):
@@ -74,19 +213,23 @@ class User:
         address['id'] = str(ObjectId())
         address['createdAt'] = datetime.utcnow()
         
-        db.users.update_one(
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$push': {'addresses': address}}
+            {'$push': {'addresses': address}},
+            projection=User.PROFILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        return user
     
     @staticmethod
     def update_address(user_id, address_id, address_data):
         """Update delivery address"""
         db = get_db()
         
-        db.users.update_one(
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id), 'addresses.id': address_id},
             {'$set': {
                 'addresses.$.street': address_data.get('street'),
@@ -95,46 +238,63 @@ class User:
                 'addresses.$.zipCode': address_data.get('zipCode'),
                 'addresses.$.country': address_data.get('country'),
                 'addresses.$.isDefault': address_data.get('isDefault', False)
-            }}
+            }},
+            projection=User.PROFILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        # An unknown address id leaves the user unchanged
+        return user or db.users.find_one({'_id': ObjectId(user_id)}, User.PROFILE_PROJECTION)
     
     @staticmethod
     def delete_address(user_id, address_id):
         """Delete delivery address"""
         db = get_db()
         
-        db.users.update_one(
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$pull': {'addresses': {'id': address_id}}}
+            {'$pull': {'addresses': {'id': address_id}}},
+            projection=User.PROFILE_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        return user
     
     @staticmethod
     def add_to_wishlist(user_id, product_id):
         """Add product to wishlist"""
         db = get_db()
         
-        db.users.update_one(
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$addToSet': {'wishlist': product_id}}
+            {'$addToSet': {'wishlist': product_id}},
+            projection=User.WISHLIST_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        return user
     
     @staticmethod
     def remove_from_wishlist(user_id, product_id):
         """Remove product from wishlist"""
         db = get_db()
         
-        db.users.update_one(
+        user = db.users.find_one_and_update(
             {'_id': ObjectId(user_id)},
-            {'$pull': {'wishlist': product_id}}
+            {'$pull': {'wishlist': product_id}},
+            projection=User.WISHLIST_PROJECTION,
+            return_document=ReturnDocument.AFTER
         )
         
-        return User.find_by_id(user_id)
+        User.invalidate_cache(user_id)
+        
+        return user
     
     @staticmethod
     def format_user(user):
@@ -155,10 +315,12 @@ class User:
         }
     
     @staticmethod
-    def generate_token(user_id):
-        """Generate JWT token"""
+    def generate_token(user_id, role='customer', token_version=0):
+        """Generate JWT token carrying the user's role and tokenVersion"""
         payload = {
             'user_id': str(user_id),
+            'role': role,
+            'tokenVersion': token_version,
             'exp': datetime.utcnow() + current_app.config['JWT_ACCESS_TOKEN_EXPIRES']
         }
         
@@ -171,16 +333,47 @@ class User:
         return token
     
     @staticmethod
-    def verify_token(token):
-        """Verify JWT token"""
+    def decode_token(token):
+        """Verify JWT token and return its claims"""
         try:
-            payload = jwt.decode(
+            return jwt.decode(
                 token,
                 current_app.config['JWT_SECRET_KEY'],
                 algorithms=['HS256']
             )
-            return payload['user_id']
         except jwt.ExpiredSignatureError:
             return None
         except jwt.InvalidTokenError:
             return None
+    
+    @staticmethod
+    def verify_token(token):
+        """Verify JWT token"""
+        payload = User.decode_token(token)
+        return payload['user_id'] if payload else None
+    
+    @staticmethod
+    def principal_from_claims(payload):
+        """
+        Principal for verified token claims. Tokens carrying role and
+        tokenVersion are trusted once the version matches the user's current
+        one, so no user document is read; older tokens fall back to the
+        cached principal lookup. Returns None for revoked tokens or unknown users.
+        
+        On a mismatch the version is re-read from the database before the
+        token is rejected: another worker may have issued it after a password
+        or role change this worker's cache has not seen yet.
+        """
+        user_id = payload['user_id']
+        
+        if 'tokenVersion' not in payload:
+            return User.find_principal(user_id)
+        
+        if User.token_version(user_id) != payload['tokenVersion'] and \
+                User.token_version(user_id, fresh=True) != payload['tokenVersion']:
+            return None
+        
+        return {'_id': ObjectId(user_id), 'role': payload.get('role')}
+
+# Writes made by other workers reach this process through the change stream watcher
+subscribe('users', User.invalidate_cache)
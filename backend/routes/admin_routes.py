@@ -1,6 +1,8 @@
 from flask import Blueprint, request, jsonify
 from middleware.auth_middleware import admin_required
+from models.product import Product
 from database.db import get_db
+from database.pagination import count_documents, paginate_by_cursor
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
 
@@ -55,10 +57,11 @@ def get_dashboard(current_user):
         ]
         top_products = list(db.orders.aggregate(top_products_pipeline))
         
-        # Get product names
+        # Get product names in one query
+        products, _ = Product.find_many(product['_id'] for product in top_products)
+        names = {p['id']: p['name'] for p in products}
         for product in top_products:
-            product_doc = db.products.find_one({'_id': ObjectId(product['_id'])})
-            product['name'] = product_doc['name'] if product_doc else 'Unknown'
+            product['name'] = names.get(str(product['_id']), 'Unknown')
         
         # Newsletter subscribers
         newsletter_subscribers = db.newsletter.count_documents({'isActive': True})
@@ -90,12 +93,26 @@ def get_users(current_user):
         
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
+        cursor = request.args.get('cursor')
+        
+        from models.user import User
+        
+        if cursor is not None:
+            include_total = request.args.get('includeTotal', 'false') == 'true'
+            users, meta = paginate_by_cursor(
+                db.users, {}, limit, cursor,
+                include_total=include_total, count_mode='estimated'
+            )
+            return jsonify({
+                'users': [User.format_user(user) for user in users],
+                **meta
+            }), 200
+        
         skip = (page - 1) * limit
         
-        users = list(db.users.find({}).skip(skip).limit(limit))
-        total = db.users.count_documents({})
+        users = list(db.users.find({}).sort([('createdAt', -1), ('_id', -1)]).skip(skip).limit(limit))
+        total = count_documents(db.users, {}, 'estimated')
         
-        from models.user import User
         formatted_users = [User.format_user(user) for user in users]
         
         return jsonify({
@@ -105,6 +122,8 @@ def get_users(current_user):
             'pages': (total + limit - 1) // limit
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch users'}), 500
 
@@ -122,6 +141,7 @@ def update_user_role(current_user, user_id):
             return jsonify({'error': 'Invalid role'}), 400
         
         from models.user import User
+        # User.update bumps tokenVersion, so tokens carrying the old role stop working
         User.update(user_id, {'role': data['role']})
         
         return jsonify({
@@ -219,9 +239,14 @@ def get_customer_analytics(current_user):
         
         top_customers = list(db.orders.aggregate(top_customers_pipeline))
         
-        # Get customer names
+        # Get customer names in one query
+        user_ids = [ObjectId(c['_id']) for c in top_customers if ObjectId.is_valid(c['_id'])]
+        users = {
+            str(user['_id']): user
+            for user in db.users.find({'_id': {'$in': user_ids}}, {'name': 1, 'email': 1})
+        }
         for customer in top_customers:
-            user = db.users.find_one({'_id': ObjectId(customer['_id'])})
+            user = users.get(str(customer['_id']))
             customer['name'] = user['name'] if user else 'Unknown'
             customer['email'] = user['email'] if user else 'Unknown'
         
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models.user import User
+from models.refresh_token import RefreshToken
+from models.password_hasher import HasherBusy
 from middleware.auth_middleware import token_required
 from middleware.validators import validate_registration_data, validate_required_fields
 
@@ -19,16 +21,19 @@ def register():
             phone=data.get('phone')
         )
         
-        token = User.generate_token(user['id'])
+        token = User.generate_token(user['id'], user['role'])
         
         return jsonify({
             'message': 'User registered successfully',
             'user': user,
-            'token': token
+            'token': token,
+            'refreshToken': RefreshToken.issue(user['id'])
         }), 201
         
     except ValueError as e:
         return jsonify({'error': str(e)}), 409
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': 'Registration failed'}), 500
 
@@ -48,25 +53,81 @@ def login():
         if not User.verify_password(user['password'], data['password']):
             return jsonify({'error': 'Invalid email or password'}), 401
         
+        # Upgrade hashes made with older parameters
+        User.rehash_password_if_needed(user, data['password'])
+        
         # Generate token
-        token = User.generate_token(str(user['_id']))
+        token = User.generate_token(
+            str(user['_id']), user.get('role'), user.get('tokenVersion', 0)
+        )
         
         return jsonify({
             'message': 'Login successful',
             'user': User.format_user(user),
-            'token': token
+            'token': token,
+            'refreshToken': RefreshToken.issue(user['_id'])
         }), 200
         
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': 'Login failed'}), 500
 
+@auth_bp.route('/refresh', methods=['POST'])
+@validate_required_fields(['refreshToken'])
+def refresh():
+    """Exchange a refresh token for a new access token and refresh token"""
+    try:
+        data = request.get_json()
+        if not isinstance(data['refreshToken'], str):
+            return jsonify({'error': 'Invalid refresh token'}), 400
+        
+        rotated = RefreshToken.rotate(data['refreshToken'])
+        if not rotated:
+            return jsonify({'error': 'Invalid or expired refresh token'}), 401
+        user_id, refresh_token = rotated
+        
+        # Role and tokenVersion are read fresh, so refreshed tokens reflect role changes
+        user = User.find_by_id(user_id)
+        if not user:
+            RefreshToken.revoke(refresh_token)
+            return jsonify({'error': 'User not found'}), 401
+        
+        return jsonify({
+            'token': User.generate_token(user_id, user.get('role'), user.get('tokenVersion', 0)),
+            'refreshToken': refresh_token
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Token refresh failed'}), 500
+
+@auth_bp.route('/logout', methods=['POST'])
+@validate_required_fields(['refreshToken'])
+def logout():
+    """Revoke a refresh token"""
+    try:
+        data = request.get_json()
+        if not isinstance(data['refreshToken'], str):
+            return jsonify({'error': 'Invalid refresh token'}), 400
+        
+        RefreshToken.revoke(data['refreshToken'])
+        
+        return jsonify({
+            'message': 'Logged out successfully'
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Logout failed'}), 500
+
 @auth_bp.route('/me', methods=['GET'])
 @token_required
 def get_current_user(current_user):
     """Get current user profile"""
     try:
+        user = User.find_by_id(current_user['_id'])
+        
         return jsonify({
-            'user': User.format_user(current_user)
+            'user': User.format_user(user)
         }), 200
     except Exception as e:
         return jsonify({'error': 'Failed to fetch user'}), 500
@@ -100,20 +161,28 @@ def change_password(current_user):
     try:
         data = request.get_json()
         
-        # Verify current password
-        if not User.verify_password(current_user['password'], data['currentPassword']):
+        # Verify current password (the principal does not carry the hash)
+        user = User.find_by_id(current_user['_id'])
+        if not User.verify_password(user['password'], data['currentPassword']):
             return jsonify({'error': 'Current password is incorrect'}), 401
         
         # Update password
-        from werkzeug.security import generate_password_hash
-        User.update(str(current_user['_id']), {
-            'password': generate_password_hash(data['newPassword'])
+        # Changing the password revokes every issued token, so hand back new ones
+        updated_user = User.update(str(current_user['_id']), {
+            'password': User.hash_password(data['newPassword'])
         })
+        RefreshToken.revoke_for_user(updated_user['_id'])
         
         return jsonify({
-            'message': 'Password changed successfully'
+            'message': 'Password changed successfully',
+            'token': User.generate_token(
+                str(updated_user['_id']), updated_user.get('role'), updated_user['tokenVersion']
+            ),
+            'refreshToken': RefreshToken.issue(updated_user['_id'])
         }), 200
         
+    except HasherBusy:
+        return jsonify({'error': 'Server busy, please retry'}), 503, {'Retry-After': '1'}
     except Exception as e:
         return jsonify({'error': 'Failed to change password'}), 500
 
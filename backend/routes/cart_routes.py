@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from middleware.auth_middleware import token_required
+from models.product import Product
+from models.stock_hold import StockHold
+from models.stock_shard import StockShards
 from database.db import get_db
-from bson.objectid import ObjectId
 
 cart_bp = Blueprint('cart', __name__)
 
@@ -41,14 +43,25 @@ def add_to_cart(current_user):
         
         db = get_db()
         
-        # Verify product exists and has stock
-        product = db.products.find_one({'_id': ObjectId(data['productId'])})
+        # Verify product exists and has stock (served from the catalog cache)
+        product = Product.find_by_id(data['productId'])
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
         if product.get('stock', 0) < data['quantity']:
             return jsonify({'error': 'Insufficient stock'}), 400
         
+        # Optionally hold the stock until checkout (or until the hold expires)
+        hold = None
+        if _holds_stock(data['productId']):
+            StockHold.release_expired_for_user(current_user['_id'], data['productId'])
+            hold = StockHold.place(
+                current_user['_id'], data['productId'], data['quantity'],
+                current_app.config['CART_HOLD_TTL_SECONDS']
+            )
+            if hold is None:
+                return jsonify({'error': 'Insufficient stock'}), 400
+        
         # Get or create cart
         cart = db.carts.find_one({'userId': str(current_user['_id'])})
         
@@ -81,24 +94,59 @@ def add_to_cart(current_user):
         cart['total'] = sum(item['price'] * item['quantity'] for item in cart['items'])
         
         # Update cart
-        db.carts.update_one(
-            {'userId': str(current_user['_id'])},
-            {'$set': cart},
-            upsert=True
-        )
-        
-        return jsonify({
+        try:
+            db.carts.update_one(
+                {'userId': str(current_user['_id'])},
+                {'$set': cart},
+                upsert=True
+            )
+        except Exception:
+            if hold is not None:
+                StockHold.release({'_id': hold['_id']})
+            raise
+        
+        response = {
             'message': 'Item added to cart',
             'cart': {
                 'items': cart['items'],
                 'total': cart['total'],
                 'itemCount': len(cart['items'])
             }
-        }), 200
+        }
+        if hold is not None:
+            response['holdExpiresAt'] = hold['expiresAt'].isoformat()
+        
+        return jsonify(response), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to add item to cart'}), 500
 
+def _holds_stock(product_id):
+    """Whether cart lines of this product hold stock (sharded stock is never held)"""
+    return bool(current_app.config.get('CART_HOLDS_ENABLED')) and not StockShards.shard_count(product_id)
+
+def _adjust_hold(user_id, product_id, old_quantity, new_quantity):
+    """Move a cart line's hold to a new quantity; False if stock ran out"""
+    if StockShards.shard_count(product_id):
+        return True
+    
+    if new_quantity > old_quantity:
+        StockHold.release_expired_for_user(user_id, product_id)
+        return StockHold.place(
+            user_id, product_id, new_quantity - old_quantity,
+            current_app.config['CART_HOLD_TTL_SECONDS']
+        ) is not None
+    
+    if new_quantity < old_quantity:
+        StockHold.release_for_user(user_id, product_id)
+        if new_quantity > 0:
+            # Best effort: the hold was just freed, so this only fails under a race
+            StockHold.place(
+                user_id, product_id, new_quantity,
+                current_app.config['CART_HOLD_TTL_SECONDS']
+            )
+    return True
+
 @cart_bp.route('/update', methods=['PUT'])
 @token_required
 def update_cart_item(current_user):
@@ -118,6 +166,10 @@ def update_cart_item(current_user):
         # Update item quantity
         for item in cart.get('items', []):
             if item['productId'] == data['productId']:
+                if current_app.config.get('CART_HOLDS_ENABLED'):
+                    if not _adjust_hold(current_user['_id'], item['productId'],
+                                        item['quantity'], data['quantity']):
+                        return jsonify({'error': 'Insufficient stock'}), 400
                 item['quantity'] = data['quantity']
                 break
         
@@ -159,6 +211,9 @@ def remove_from_cart(current_user, product_id):
         # Remove item
         cart['items'] = [item for item in cart['items'] if item['productId'] != product_id]
         
+        if current_app.config.get('CART_HOLDS_ENABLED'):
+            StockHold.release_for_user(current_user['_id'], product_id)
+        
         # Recalculate total
         cart['total'] = sum(item['price'] * item['quantity'] for item in cart['items'])
         
@@ -187,6 +242,9 @@ def clear_cart(current_user):
     try:
         db = get_db()
         
+        if current_app.config.get('CART_HOLDS_ENABLED'):
+            StockHold.release_for_user(current_user['_id'])
+        
         db.carts.update_one(
             {'userId': str(current_user['_id'])},
             {'$set': {
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from database.db import get_db
+from database.pagination import count_documents, paginate_by_cursor
 from datetime import datetime
 import re
 
@@ -10,6 +11,14 @@ def validate_email(email):
     pattern = r'^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$'
     return re.match(pattern, email) is not None
 
+def format_subscriber(subscriber):
+    """Format newsletter subscriber for response"""
+    return {
+        'email': subscriber['email'],
+        'name': subscriber.get('name'),
+        'subscribedAt': subscriber['subscribedAt'].isoformat()
+    }
+
 @newsletter_bp.route('/subscribe', methods=['POST'])
 def subscribe():
     """Subscribe to newsletter"""
@@ -100,27 +109,35 @@ def get_subscribers():
         
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 50))
+        cursor = request.args.get('cursor')
+        
+        if cursor is not None:
+            include_total = request.args.get('includeTotal', 'false') == 'true'
+            subscribers, meta = paginate_by_cursor(
+                db.newsletter, {'isActive': True}, limit, cursor,
+                sort_field='subscribedAt', include_total=include_total, count_mode='cached'
+            )
+            return jsonify({
+                'subscribers': [format_subscriber(s) for s in subscribers],
+                **meta
+            }), 200
+        
         skip = (page - 1) * limit
         
         subscribers = list(db.newsletter.find(
             {'isActive': True}
-        ).skip(skip).limit(limit))
+        ).sort([('subscribedAt', -1), ('_id', -1)]).skip(skip).limit(limit))
         
-        total = db.newsletter.count_documents({'isActive': True})
+        total = count_documents(db.newsletter, {'isActive': True}, 'cached')
         
         return jsonify({
-            'subscribers': [
-                {
-                    'email': s['email'],
-                    'name': s.get('name'),
-                    'subscribedAt': s['subscribedAt'].isoformat()
-                }
-                for s in subscribers
-            ],
+            'subscribers': [format_subscriber(s) for s in subscribers],
             'total': total,
             'page': page,
             'pages': (total + limit - 1) // limit
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch subscribers'}), 500
@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from models.order import Order
 from models.product import Product
+from models.stock_hold import StockHold
 from middleware.auth_middleware import token_required, admin_required
 from middleware.validators import validate_order_data
 from database.db import get_db
@@ -15,15 +16,26 @@ def create_order(current_user):
     try:
         data = request.get_json()
         
-        # Verify stock for all items
-        for item in data['items']:
-            product = Product.find_by_id(item['productId'])
-            if not product:
-                return jsonify({'error': f"Product {item['productId']} not found"}), 404
-            if product['stock'] < item['quantity']:
-                return jsonify({
-                    'error': f"Insufficient stock for {product['name']}"
-                }), 400
+        # Reserve stock for every line in one atomic round trip
+        holds_enabled = current_app.config.get('CART_HOLDS_ENABLED')
+        held = None
+        if holds_enabled:
+            StockHold.release_expired_for_user(current_user['_id'])
+            held = StockHold.held_by_user(current_user['_id'])
+        shortages = Product.reserve_stock(data['items'], held)
+        if shortages:
+            not_found = [s['productId'] for s in shortages if not s['found']]
+            if not_found:
+                return jsonify({'error': f"Product {not_found[0]} not found"}), 404
+            
+            names = ', '.join(s['name'] for s in shortages)
+            return jsonify({
+                'error': f"Insufficient stock for {names}",
+                'shortages': [
+                    {key: s[key] for key in ('productId', 'name', 'requested', 'available')}
+                    for s in shortages
+                ]
+            }), 400
         
         # Calculate totals
         subtotal = sum(item['price'] * item['quantity'] for item in data['items'])
@@ -43,11 +55,16 @@ def create_order(current_user):
             'notes': data.get('notes')
         }
         
-        order = Order.create(str(current_user['_id']), order_data)
+        try:
+            order = Order.create(str(current_user['_id']), order_data)
+        except Exception:
+            # Give the reserved stock back if the order could not be written
+            Product.release_stock(data['items'])
+            raise
         
-        # Update product stock
-        for item in data['items']:
-            Product.update_stock(item['productId'], -item['quantity'])
+        # The cart's holds became the order's stock
+        if holds_enabled:
+            StockHold.release_for_user(current_user['_id'])
         
         # Clear user's cart
         db = get_db()
@@ -61,6 +78,8 @@ def create_order(current_user):
             'order': order
         }), 201
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -71,11 +90,21 @@ def get_user_orders(current_user):
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('includeTotal', 'false') == 'true'
         
-        result = Order.find_by_user(str(current_user['_id']), page, limit)
+        if cursor is not None:
+            result = Order.find_by_user(
+                str(current_user['_id']), limit=limit,
+                cursor=cursor, include_total=include_total
+            )
+        else:
+            result = Order.find_by_user(str(current_user['_id']), page, limit)
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
@@ -144,8 +173,7 @@ def cancel_order(current_user, order_id):
         updated_order = Order.update_status(order_id, 'cancelled', 'Cancelled by customer')
         
         # Restore product stock
-        for item in order['items']:
-            Product.update_stock(item['productId'], item['quantity'])
+        Product.release_stock(order['items'])
         
         return jsonify({
             'message': 'Order cancelled successfully',
@@ -163,15 +191,24 @@ def get_all_orders(current_user):
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
         status = request.args.get('status')
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('includeTotal', 'false') == 'true'
         
         filters = {}
         if status:
             filters['orderStatus'] = status
         
-        result = Order.find_all(filters, page, limit)
+        if cursor is not None:
+            result = Order.find_all(
+                filters, limit=limit, cursor=cursor, include_total=include_total
+            )
+        else:
+            result = Order.find_all(filters, page, limit)
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
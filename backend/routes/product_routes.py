@@ -1,53 +1,145 @@
 from flask import Blueprint, request, jsonify
 from models.product import Product
+from models.search_index import search_index
 from middleware.auth_middleware import admin_required, optional_token
 from middleware.validators import validate_product_data
+from middleware.conditional import make_etag, not_modified, with_validators
+from config import Config
+from datetime import datetime
 
 product_bp = Blueprint('products', __name__)
 
+def build_product_filters(args):
+    """Build the catalog filter from category/price/tags query parameters"""
+    category = args.get('category')
+    min_price = args.get('minPrice')
+    max_price = args.get('maxPrice')
+    tags = args.get('tags')
+    
+    filters = {'isActive': True}
+    
+    if category:
+        filters['category'] = category
+    
+    if min_price or max_price:
+        filters['price'] = {}
+        if min_price:
+            filters['price']['$gte'] = float(min_price)
+        if max_price:
+            filters['price']['$lte'] = float(max_price)
+    
+    if tags:
+        tag_list = tags.split(',')
+        filters['tags'] = {'$in': tag_list}
+    
+    return filters
+
+def build_product_sort(args):
+    """Build the catalog sort from sortBy/sortOrder query parameters"""
+    sort_by = args.get('sortBy', 'createdAt')
+    sort_order = args.get('sortOrder', 'desc')
+    return [(sort_by, -1 if sort_order == 'desc' else 1)]
+
 @product_bp.route('/', methods=['GET'])
 @optional_token
 def get_products(current_user):
     """Get all products with filters and pagination"""
     try:
+        # The listing only changes when some product changes
+        version = Product.catalog_version()
+        etag = make_etag('products', version, request.query_string.decode('utf-8'))
+        unchanged = not_modified(etag, version)
+        if unchanged:
+            return unchanged
+        
         # Get query parameters
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 20))
-        category = request.args.get('category')
-        min_price = request.args.get('minPrice')
-        max_price = request.args.get('maxPrice')
-        tags = request.args.get('tags')
-        sort_by = request.args.get('sortBy', 'createdAt')
-        sort_order = request.args.get('sortOrder', 'desc')
         search = request.args.get('search')
+        cursor = request.args.get('cursor')
         
-        # Build filters
-        filters = {'isActive': True}
-        
-        if category:
-            filters['category'] = category
-        
-        if min_price or max_price:
-            filters['price'] = {}
-            if min_price:
-                filters['price']['$gte'] = float(min_price)
-            if max_price:
-                filters['price']['$lte'] = float(max_price)
-        
-        if tags:
-            tag_list = tags.split(',')
-            filters['tags'] = {'$in': tag_list}
-        
-        # Build sort
-        sort = [(sort_by, -1 if sort_order == 'desc' else 1)]
+        filters = build_product_filters(request.args)
+        sort = build_product_sort(request.args)
         
         # Search or filter
         if search:
-            result = Product.search(search, page, limit)
+            result = Product.search(search, page, limit, filters)
+        elif cursor is not None:
+            # Keyset pagination: total is only counted when asked for
+            include_total = request.args.get('includeTotal', 'false') == 'true'
+            result = Product.find_all(
+                filters, limit=limit, sort=sort,
+                cursor=cursor, include_total=include_total
+            )
         else:
             result = Product.find_all(filters, page, limit, sort)
         
-        return jsonify(result), 200
+        return with_validators(jsonify(result), etag, version), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch products'}), 500
+
+@product_bp.route('/facets', methods=['GET'])
+def get_product_facets():
+    """Get a result page plus category, tag and price facets in one query"""
+    try:
+        version = Product.catalog_version()
+        etag = make_etag('facets', version, request.query_string.decode('utf-8'))
+        unchanged = not_modified(etag, version)
+        if unchanged:
+            return unchanged
+        
+        page = int(request.args.get('page', 1))
+        limit = int(request.args.get('limit', 20))
+        
+        filters = build_product_filters(request.args)
+        sort = build_product_sort(request.args)
+        
+        result = Product.find_with_facets(filters, page, limit, sort)
+        
+        return with_validators(jsonify(result), etag, version), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch product facets'}), 500
+
+@product_bp.route('/suggest', methods=['GET'])
+def suggest_products():
+    """Typo-tolerant as-you-type product suggestions"""
+    try:
+        query = request.args.get('q', '')
+        limit = min(int(request.args.get('limit', 8)), 20)
+        
+        return jsonify({
+            'suggestions': search_index.suggest(query, limit)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch suggestions'}), 500
+
+@product_bp.route('/batch', methods=['GET'])
+def get_products_batch():
+    """Get several products by ID (comma-separated `ids`) in one request"""
+    try:
+        ids = [i.strip() for i in request.args.get('ids', '').split(',') if i.strip()]
+        
+        if not ids:
+            return jsonify({'error': 'ids is required'}), 400
+        
+        if len(ids) > Config.MAX_PAGE_SIZE:
+            return jsonify({'error': f'At most {Config.MAX_PAGE_SIZE} ids per request'}), 400
+        
+        products, missing = Product.find_many(ids)
+        
+        return jsonify({
+            'products': products,
+            'missing': missing
+        }), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch products'}), 500
@@ -61,7 +153,13 @@ def get_product(product_id):
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify(product), 200
+        updated_at = datetime.fromisoformat(product['updatedAt']) if product.get('updatedAt') else None
+        etag = make_etag('product', product['id'], product.get('updatedAt'))
+        unchanged = not_modified(etag, updated_at)
+        if unchanged:
+            return unchanged
+        
+        return with_validators(jsonify(product), etag, updated_at), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch product'}), 500
@@ -75,7 +173,13 @@ def get_product_by_slug(slug):
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify(product), 200
+        updated_at = datetime.fromisoformat(product['updatedAt']) if product.get('updatedAt') else None
+        etag = make_etag('product', product['id'], product.get('updatedAt'))
+        unchanged = not_modified(etag, updated_at)
+        if unchanged:
+            return unchanged
+        
+        return with_validators(jsonify(product), etag, updated_at), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch product'}), 500
@@ -157,21 +261,53 @@ def update_stock(current_user, product_id):
             'product': product
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to update stock'}), 500
 
+@product_bp.route('/<product_id>/stock-shards', methods=['PUT'])
+@admin_required
+def update_stock_shards(current_user, product_id):
+    """Split a hot product's stock across counters, or merge them (admin only)"""
+    try:
+        data = request.get_json()
+        
+        if 'shards' not in data:
+            return jsonify({'error': 'Shard count is required'}), 400
+        
+        if not Product.set_stock_shards(product_id, int(data['shards'])):
+            return jsonify({'error': 'Product not found'}), 404
+        
+        return jsonify({
+            'message': 'Stock sharding updated successfully',
+            'product': Product.find_by_id(product_id)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to update stock sharding'}), 500
+
 @product_bp.route('/categories', methods=['GET'])
 def get_categories():
     """Get all product categories"""
     try:
         from database.db import get_db
+        
+        version = Product.catalog_version()
+        etag = make_etag('categories', version)
+        unchanged = not_modified(etag, version)
+        if unchanged:
+            return unchanged
+        
         db = get_db()
         
         categories = db.products.distinct('category', {'isActive': True})
         
-        return jsonify({
+        return with_validators(jsonify({
             'categories': categories
-        }), 200
+        }), etag, version), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch categories'}), 500
@@ -181,14 +317,21 @@ def get_tags():
     """Get all product tags"""
     try:
         from database.db import get_db
+        
+        version = Product.catalog_version()
+        etag = make_etag('tags', version)
+        unchanged = not_modified(etag, version)
+        if unchanged:
+            return unchanged
+        
         db = get_db()
         
         # Get all unique tags
         tags = db.products.distinct('tags', {'isActive': True})
         
-        return jsonify({
+        return with_validators(jsonify({
             'tags': tags
-        }), 200
+        }), etag, version), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch tags'}), 500
@@ -1,8 +1,11 @@
 from flask import Blueprint, request, jsonify
 from models.review import Review
+from models.review_summary import ReviewSummary
 from models.product import Product
 from middleware.auth_middleware import token_required, optional_token
 from middleware.validators import validate_review_data
+from middleware.conditional import make_etag, not_modified, with_validators
+from datetime import datetime
 
 review_bp = Blueprint('reviews', __name__)
 
@@ -13,14 +16,46 @@ def get_product_reviews(current_user, product_id):
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
-        
-        result = Review.find_by_product(product_id, page, limit)
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('includeTotal', 'false') == 'true'
+        sort = request.args.get('sort', 'newest')
+        
+        if cursor is not None:
+            result = Review.find_by_product(
+                product_id, limit=limit,
+                cursor=cursor, include_total=include_total, sort=sort
+            )
+        else:
+            result = Review.find_by_product(product_id, page, limit, sort=sort)
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch reviews'}), 500
 
+@review_bp.route('/product/<product_id>/summary', methods=['GET'])
+def get_review_summary(product_id):
+    """Get rating distribution and most helpful reviews for a product"""
+    try:
+        summary = ReviewSummary.get(product_id)
+        
+        if not summary:
+            return jsonify({'error': 'Product not found'}), 404
+        
+        updated_at = datetime.fromisoformat(summary['updatedAt']) if summary.get('updatedAt') else None
+        # ETag and Last-Modified both come from the stored (millisecond) updatedAt
+        etag = make_etag('review-summary', product_id, updated_at.isoformat() if updated_at else None)
+        unchanged = not_modified(etag, updated_at)
+        if unchanged:
+            return unchanged
+        
+        return with_validators(jsonify(summary), etag, updated_at), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch review summary'}), 500
+
 @review_bp.route('/user', methods=['GET'])
 @token_required
 def get_user_reviews(current_user):
@@ -28,11 +63,21 @@ def get_user_reviews(current_user):
     try:
         page = int(request.args.get('page', 1))
         limit = int(request.args.get('limit', 10))
+        cursor = request.args.get('cursor')
+        include_total = request.args.get('includeTotal', 'false') == 'true'
         
-        result = Review.find_by_user(str(current_user['_id']), page, limit)
+        if cursor is not None:
+            result = Review.find_by_user(
+                str(current_user['_id']), limit=limit,
+                cursor=cursor, include_total=include_total
+            )
+        else:
+            result = Review.find_by_user(str(current_user['_id']), page, limit)
         
         return jsonify(result), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch reviews'}), 500
 
@@ -58,8 +103,9 @@ def create_review(current_user):
             data
         )
         
-        # Update product rating
-        Product.update_rating(data['productId'], data['rating'], increment=True)
+        # Update product rating and review summary
+        product = Product.update_rating(data['productId'], added=review['rating'])
+        ReviewSummary.refresh(data['productId'], product=product)
         
         return jsonify({
             'message': 'Review created successfully',
@@ -79,31 +125,26 @@ def update_review(current_user, review_id):
     try:
         data = request.get_json()
         
-        # Get old review to update product rating
-        old_review = Review.find_by_id(review_id)
-        if not old_review:
+        if not Review.find_by_id(review_id):
             return jsonify({'error': 'Review not found'}), 404
         
-        updated_review = Review.update(
+        # The old rating comes from the update itself, so concurrent edits
+        # each move the review from the rating they actually replaced
+        old_review, updated_review = Review.update(
             review_id,
             str(current_user['_id']),
             data
         )
         
-        # Update product rating if rating changed
-        if 'rating' in data and data['rating'] != old_review['rating']:
-            # Remove old rating
-            Product.update_rating(
+        # Move the review between rating buckets if the rating changed
+        product = None
+        if updated_review['rating'] != old_review['rating']:
+            product = Product.update_rating(
                 old_review['productId'],
-                old_review['rating'],
-                increment=False
-            )
-            # Add new rating
-            Product.update_rating(
-                old_review['productId'],
-                data['rating'],
-                increment=True
+                added=updated_review['rating'],
+                removed=old_review['rating']
             )
+        ReviewSummary.refresh(old_review['productId'], product=product)
         
         return jsonify({
             'message': 'Review updated successfully',
@@ -120,19 +161,15 @@ def update_review(current_user, review_id):
 def delete_review(current_user, review_id):
     """Delete a review"""
     try:
-        # Get review to update product rating
-        review = Review.find_by_id(review_id)
-        if not review:
+        if not Review.find_by_id(review_id):
             return jsonify({'error': 'Review not found'}), 404
         
-        Review.delete(review_id, str(current_user['_id']))
+        # Only the request whose delete removed the review adjusts the rating
+        review = Review.delete(review_id, str(current_user['_id']))
         
-        # Update product rating
-        Product.update_rating(
-            review['productId'],
-            review['rating'],
-            increment=False
-        )
+        # Update product rating and review summary
+        product = Product.update_rating(review['productId'], removed=review['rating'])
+        ReviewSummary.refresh(review['productId'], product=product)
         
         return jsonify({
             'message': 'Review deleted successfully'
@@ -152,6 +189,10 @@ def mark_helpful(review_id):
         if not updated_review:
             return jsonify({'error': 'Review not found'}), 404
         
+        # Buffered votes refresh summaries when the batch is flushed
+        if not Review.votes_buffered():
+            ReviewSummary.refresh_for_reviews([review_id])
+        
         return jsonify({
             'message': 'Review marked as helpful',
             'review': updated_review
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from middleware.auth_middleware import token_required
+from models.product import Product
 from database.db import get_db
 from datetime import datetime, timedelta
 from bson.objectid import ObjectId
@@ -17,10 +18,13 @@ def get_user_subscriptions(current_user):
             'userId': str(current_user['_id'])
         }).sort('createdAt', -1))
         
+        # Get product info for all subscriptions in one query
+        products, _ = Product.find_many(sub['productId'] for sub in subscriptions)
+        products_by_id = {product['id']: product for product in products}
+        
         formatted = []
         for sub in subscriptions:
-            # Get product info
-            product = db.products.find_one({'_id': ObjectId(sub['productId'])})
+            product = products_by_id.get(sub['productId'])
             
             formatted.append({
                 'id': str(sub['_id']),
@@ -59,7 +63,7 @@ def create_subscription(current_user):
         db = get_db()
         
         # Verify product
-        product = db.products.find_one({'_id': ObjectId(data['productId'])})
+        product = Product.find_by_id(data['productId'])
         if not product:
             return jsonify({'error': 'Product not found'}), 404
         
@@ -10,14 +10,10 @@ wishlist_bp = Blueprint('wishlist', __name__)
 def get_wishlist(current_user):
     """Get user's wishlist"""
     try:
-        wishlist_ids = current_user.get('wishlist', [])
+        wishlist_ids = User.get_wishlist(current_user['_id'])
         
-        # Get product details for each item
-        products = []
-        for product_id in wishlist_ids:
-            product = Product.find_by_id(product_id)
-            if product:
-                products.append(product)
+        # Get product details for all items in one query
+        products, _ = Product.find_many(wishlist_ids)
         
         return jsonify({
             'wishlist': products
@@ -66,7 +62,7 @@ def remove_from_wishlist(current_user, product_id):
 def check_wishlist(current_user, product_id):
     """Check if product is in wishlist"""
     try:
-        wishlist = current_user.get('wishlist', [])
+        wishlist = User.get_wishlist(current_user['_id'])
         in_wishlist = product_id in wishlist
         
         return jsonify({
@@ -0,0 +1,35 @@
+"""Shared fixtures: app instances backed by an in-memory MongoDB (mongomock)"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+mongomock = pytest.importorskip('mongomock')
+
+from app import create_app
+from config import Config
+from database import db as database
+from models.password_hasher import hasher
+from models.user import User
+
+@pytest.fixture
+def make_app(monkeypatch):
+    """
+    Factory for app instances sharing one in-memory database, standing in
+    for separate workers. Hashing runs inline and change streams are off,
+    so each instance only sees other instances' writes through MongoDB.
+    """
+    store = mongomock.MongoClient()
+    monkeypatch.setattr(database, 'MongoClient', lambda uri, **options: store)
+    monkeypatch.setattr(Config, 'CHANGE_STREAMS_ENABLED', False)
+    database.close_client()
+    hasher.configure(workers=0)
+    User.invalidate_cache()
+    
+    yield lambda: create_app('testing')
+    
+    database.close_client()
+    hasher.configure(workers=Config.PASSWORD_HASH_WORKERS)
+    User.invalidate_cache()
@@ -0,0 +1,42 @@
+"""Access tokens across app instances (workers) with per-worker version caches"""
+from models.user import User, version_cache
+
+EMAIL = 'token-test@example.com'
+PASSWORD = 'OldPassw0rd!'
+NEW_PASSWORD = 'NewPassw0rd!'
+
+def test_token_from_password_change_accepted_by_other_worker(make_app):
+    worker_a = make_app().test_client()
+    worker_b = make_app().test_client()
+    
+    response = worker_a.post('/api/auth/register', json={
+        'email': EMAIL, 'password': PASSWORD, 'name': 'Token Test'
+    })
+    assert response.status_code == 201
+    
+    response = worker_a.post('/api/auth/login', json={'email': EMAIL, 'password': PASSWORD})
+    assert response.status_code == 200
+    old_token = response.get_json()['token']
+    user_id = response.get_json()['user']['id']
+    
+    # Worker A has cached the user's token version
+    assert worker_a.get('/api/auth/me', headers={'Authorization': f'Bearer {old_token}'}).status_code == 200
+    stale_version = version_cache.get(user_id)
+    
+    response = worker_b.post('/api/auth/change-password', headers={'Authorization': f'Bearer {old_token}'}, json={
+        'currentPassword': PASSWORD, 'newPassword': NEW_PASSWORD
+    })
+    assert response.status_code == 200
+    new_token = response.get_json()['token']
+    
+    # Both instances share this process's cache, which worker B just
+    # invalidated; put back what worker A would still hold
+    version_cache.set(user_id, stale_version)
+    
+    response = worker_a.get('/api/auth/me', headers={'Authorization': f'Bearer {new_token}'})
+    assert response.status_code == 200
+    assert response.get_json()['user']['email'] == EMAIL
+    
+    # The re-read refreshed worker A's cache, so the old token is now revoked
+    assert User.token_version(user_id) != stale_version
+    assert worker_a.get('/api/auth/me', headers={'Authorization': f'Bearer {old_token}'}).status_code == 401
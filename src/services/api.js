@@ -7,8 +7,9 @@ class APIService {
     this.baseURL = API_BASE_URL;
   }
 
-  // Helper method for fetch requests
-  async request(endpoint, options = {}) {
+  // Helper method for fetch requests; retries once with a refreshed
+  // access token when the current one has expired
+  async request(endpoint, options = {}, retry = true) {
     const url = `${this.baseURL}${endpoint}`;
     const config = {
       headers: {
@@ -36,6 +37,10 @@ class APIService {
         data = await response.text();
       }
 
+      if (response.status === 401 && retry && token && await this.refreshSession()) {
+        return this.request(endpoint, options, false);
+      }
+
       if (!response.ok) {
         throw new Error(data.message || data || 'API request failed');
       }
@@ -81,16 +86,62 @@ class APIService {
     return this.post('/auth/register', userData);
   }
 
-  async login(credentials) {
-    const response = await this.post('/auth/login', credentials);
+  storeTokens(response) {
     if (response.token) {
       localStorage.setItem('auth_token', response.token);
     }
+    if (response.refreshToken) {
+      localStorage.setItem('refresh_token', response.refreshToken);
+    }
+  }
+
+  async login(credentials) {
+    const response = await this.post('/auth/login', credentials);
+    this.storeTokens(response);
     return response;
   }
 
+  // Renew the access token; concurrent callers share one refresh request
+  async refreshSession() {
+    const refreshToken = localStorage.getItem('refresh_token');
+    if (!refreshToken) {
+      return false;
+    }
+
+    if (!this.refreshing) {
+      this.refreshing = fetch(`${this.baseURL}/auth/refresh`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ refreshToken }),
+      })
+        .then(async (response) => {
+          if (!response.ok) {
+            localStorage.removeItem('auth_token');
+            localStorage.removeItem('refresh_token');
+            return false;
+          }
+          this.storeTokens(await response.json());
+          return true;
+        })
+        .catch(() => false)
+        .finally(() => {
+          this.refreshing = null;
+        });
+    }
+    return this.refreshing;
+  }
+
   async logout() {
+    const refreshToken = localStorage.getItem('refresh_token');
     localStorage.removeItem('auth_token');
+    localStorage.removeItem('refresh_token');
+    if (refreshToken) {
+      try {
+        await this.post('/auth/logout', { refreshToken });
+      } catch (error) {
+        // The local session is gone either way
+      }
+    }
     return { success: true };
   }
 
@@ -98,6 +149,12 @@ class APIService {
     return this.get('/auth/profile');
   }
 
+  async changePassword(currentPassword, newPassword) {
+    const response = await this.post('/auth/change-password', { currentPassword, newPassword });
+    this.storeTokens(response);
+    return response;
+  }
+
   // ========== PRODUCT ENDPOINTS ==========
   async getProducts(filters = {}) {
     const queryParams = new URLSearchParams(filters).toString();
@@ -108,6 +165,10 @@ class APIService {
     return this.get(`/products/${id}`);
   }
 
+  async getProductsBatch(ids) {
+    return this.get(`/products/batch?ids=${ids.map(encodeURIComponent).join(',')}`);
+  }
+
   async searchProducts(query) {
     return this.get(`/products/search?q=${encodeURIComponent(query)}`);
   }
@@ -155,6 +216,10 @@ class APIService {
     return this.get(`/reviews/product/${productId}`);
   }
 
+  async getReviewSummary(productId) {
+    return this.get(`/reviews/product/${productId}/summary`);
+  }
+
   async createReview(reviewData) {
     return this.post('/reviews', reviewData);
   }